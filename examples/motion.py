@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+
+import time
+
+import pantilthat
+
+
+# The motion controller moves the servos smoothly from a background thread
+motion = pantilthat.MotionController(pantilthat.pantilthat)
+
+while True:
+    # Sweep out at up to 90 degrees per second, and wait until we get there
+    motion.move_to(-90, -45, max_speed=90, accel=180).wait()
+    time.sleep(1)
+
+    # Come back with a gentler S-curve
+    motion.move_to(90, 45, max_speed=90, accel=180, shape=pantilthat.SCURVE).wait()
+    time.sleep(1)
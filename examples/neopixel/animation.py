@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+
+import time
+
+import pantilthat
+from pantilthat.animation import Animator, Rainbow, Breathe, Chase
+
+
+pantilthat.light_mode(pantilthat.WS2812)
+pantilthat.light_type(pantilthat.GRBW)
+
+animator = Animator(pantilthat.pantilthat, fps=30)
+
+try:
+    while True:
+        for effect in [Rainbow(), Breathe((0, 0, 255)), Chase((255, 128, 0))]:
+            animator.play(effect, fade=1.0)
+            time.sleep(5)
+            print(animator.stats.as_dict())
+
+except KeyboardInterrupt:
+    animator.stop()
@@ -1,4 +1,17 @@
+from sys import version_info
+
 from .pantilt import PanTilt, WS2812, PWM, RGB, GRB, RGBW, GRBW
+from .retry import RetryPolicy, BackoffPolicy, CircuitBreaker, CircuitOpenError
+from .transport import Transport, SMBusTransport, SMBus2Transport, I2CDevTransport
+from .calibration import Calibration
+from .motion import MotionController, Profile, TRAPEZOID, SCURVE, play_trajectory, PlaybackStats, MERGE, DROP
+from .tracking import PID, TargetTracker
+
+if version_info >= (3, 2):
+    from .fleet import Fleet
+
+if version_info >= (3, 5):
+    from .aio import PanTiltAsync
 
 __version__ = '0.0.6'
 
@@ -7,9 +20,21 @@ pantilthat = PanTilt()
 setup = pantilthat.setup
 
 idle_timeout = pantilthat.idle_timeout
+retry_policy = pantilthat.retry_policy
+instrumentation = pantilthat.instrumentation
+stats = pantilthat.stats
+reset_stats = pantilthat.reset_stats
+refresh = pantilthat.refresh
+cache_info = pantilthat.cache_info
+background_writes = pantilthat.background_writes
+flush = pantilthat.flush
+writer_info = pantilthat.writer_info
+frame_coalescing = pantilthat.frame_coalescing
+frame_info = pantilthat.frame_info
 servo_enable = pantilthat.servo_enable
 servo_pulse_max = pantilthat.servo_pulse_max
 servo_pulse_min = pantilthat.servo_pulse_min
+servo_calibration = pantilthat.servo_calibration
 
 brightness = pantilthat.brightness
 clear = pantilthat.clear
@@ -18,7 +43,13 @@ light_type = pantilthat.light_type
 set_all = pantilthat.set_all
 set_pixel = pantilthat.set_pixel
 set_pixel_rgbw = pantilthat.set_pixel_rgbw
+set_pixels = pantilthat.set_pixels
+num_pixels = pantilthat.num_pixels
+gamma = pantilthat.gamma
+pixel_brightness = pantilthat.pixel_brightness
 show = pantilthat.show
+show_raw = pantilthat.show_raw
+bytes_saved = pantilthat.bytes_saved
 
 servo_one = pantilthat.servo_one
 pan = servo_one
@@ -27,3 +58,15 @@ get_pan = get_servo_one = pantilthat.get_servo_one
 servo_two = pantilthat.servo_two
 tilt = servo_two
 get_tilt = get_servo_two = pantilthat.get_servo_two
+
+servo_one_us = pan_us = pantilthat.servo_one_us
+servo_two_us = tilt_us = pantilthat.servo_two_us
+get_servo_one_us = get_pan_us = pantilthat.get_servo_one_us
+get_servo_two_us = get_tilt_us = pantilthat.get_servo_two_us
+
+pan_tilt = pantilthat.pan_tilt
+pan_tilt_us = pantilthat.pan_tilt_us
+
+servo_speed = pantilthat.servo_speed
+estimated_position = pantilthat.estimated_position
+wait_until_settled = pantilthat.wait_until_settled
@@ -0,0 +1,373 @@
+import asyncio
+import functools
+from timeit import default_timer as timer
+
+from .pantilt import PanTilt
+from .metrics import describe
+
+
+# get_running_loop is new in Python 3.7, get_event_loop is deprecated for use in coroutines
+_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+
+class _PanTiltState(PanTilt):
+    """PanTilt that queues its register writes instead of sending them.
+
+    PanTiltAsync uses this to reuse all of the range checking, config
+    and register cache logic of PanTilt, then sends the queued writes
+    to the bus itself without blocking the event loop.
+
+    """
+
+    def __init__(self, owner, **kwargs):
+        PanTilt.__init__(self, idle_timeout=0, **kwargs)
+        self._owner = owner
+        self._queued = []
+
+    def _i2c_write_now(self, reg, method, data, message):
+        self._queued.append((reg, method, data, message))
+
+    def _i2c_write_many_now(self, writes):
+        # Copied, because the pixel buffer may change before the queue is sent
+        for reg, data in writes:
+            self._queued.append((reg, 'write_i2c_block_data', bytearray(data), "Failed to write block"))
+
+    def _servo1_idle(self):
+        self._owner._servo_idle(1)
+
+    def _servo2_idle(self):
+        self._owner._servo_idle(2)
+
+    def _atexit(self):
+        pass
+
+
+class PanTiltAsync:
+    """PanTilt HAT asyncio Driver
+
+    Provides the PanTilt API as coroutines. Bus transfers run in
+    the event loop's executor, i2c retries wait with asyncio.sleep
+    and servo idle timeouts are scheduled on the event loop.
+
+    Methods that only change the LED buffer, such as set_pixel,
+    are not coroutines since they do not touch the bus.
+
+    """
+
+    def __init__(self, idle_timeout=2, **kwargs):
+        """Create a new asyncio PanTilt driver.
+
+        :param idle_timeout: Idle timeout in seconds
+        :param kwargs: Any other argument accepted by PanTilt
+
+        """
+
+        self._pantilt = _PanTiltState(self, **kwargs)
+        self._idle_timeout = idle_timeout
+        self._idle_handles = {1: None, 2: None}
+        self._lock = None
+
+        self.clear = self._pantilt.clear
+        self.instrumentation = self._pantilt.instrumentation
+        self.stats = self._pantilt.stats
+        self.reset_stats = self._pantilt.reset_stats
+        self.light_type = self._pantilt.light_type
+        self.num_pixels = self._pantilt.num_pixels
+        self.set_all = self._pantilt.set_all
+        self.set_pixel = self._pantilt.set_pixel
+        self.set_pixel_rgbw = self._pantilt.set_pixel_rgbw
+        self.set_pixels = self._pantilt.set_pixels
+        self.gamma = self._pantilt.gamma
+        self.pixel_brightness = self._pantilt.pixel_brightness
+        self.servo_pulse_min = self._pantilt.servo_pulse_min
+        self.servo_pulse_max = self._pantilt.servo_pulse_max
+        self.servo_calibration = self._pantilt.servo_calibration
+        self.servo_speed = self._pantilt.servo_speed
+        self.estimated_position = self._pantilt.estimated_position
+
+    async def _i2c_retry(self, method, args, message):
+        """Call an SMBus method in the executor, retrying on IOError according to the retry policy."""
+
+        pantilt = self._pantilt
+        loop = _running_loop()
+        call = functools.partial(getattr(pantilt._i2c, method), pantilt._i2c_address, *args)
+
+        stats = pantilt._stats
+        if stats is not None:
+            start = timer()
+
+        policy = pantilt._retry_policy
+        attempt = 0
+
+        try:
+            policy.allow()
+
+            for attempt, delay in enumerate(policy.delays()):
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                try:
+                    result = await loop.run_in_executor(None, call)
+                except IOError:
+                    continue
+
+                policy.success()
+                if stats is not None:
+                    reg, length = describe(method, args)
+                    stats.record(method, reg, length, attempt, False, timer() - start)
+                return result
+
+            policy.failure()
+            raise IOError(message)
+
+        except IOError:
+            if stats is not None:
+                reg, length = describe(method, args)
+                stats.record(method, reg, length, attempt, True, timer() - start)
+            raise
+
+    async def _flush(self):
+        """Send all queued register writes to the bus, in order."""
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        pantilt = self._pantilt
+
+        async with self._lock:
+            while pantilt._queued:
+                reg, method, data, message = pantilt._queued.pop(0)
+                try:
+                    await self._i2c_retry(method, (reg, data), message)
+                except IOError:
+                    # The register state is unknown, make sure it's sent again next time
+                    pantilt._i2c_write_failed(reg, method, data)
+                    raise
+
+    def _servo_idle(self, index):
+        if self._idle_timeout <= 0:
+            return
+
+        handle = self._idle_handles[index]
+        if handle is not None:
+            handle.cancel()
+
+        loop = _running_loop()
+        self._idle_handles[index] = loop.call_later(self._idle_timeout, self._servo_stop, index)
+
+    def _servo_stop(self, index):
+        self._idle_handles[index] = None
+
+        if index == 1:
+            self._pantilt._servo1_stop()
+        else:
+            self._pantilt._servo2_stop()
+
+        task = asyncio.ensure_future(self._flush())
+        # A failed write here will be retried by the next config change
+        task.add_done_callback(lambda task: task.exception())
+
+    def idle_timeout(self, value):
+        """Set the idle timeout for the servos
+
+        Configure the time, in seconds, after which the servos will be automatically disabled.
+
+        :param value: Timeout in seconds
+
+        """
+
+        self._idle_timeout = value
+
+    async def setup(self):
+        """Set up PanTilt HAT, clearing the lights and disabling the servos."""
+
+        self._pantilt.setup()
+        await self._flush()
+
+    async def close(self):
+        """Cancel any idle timeouts and disable both servos."""
+
+        for index, handle in self._idle_handles.items():
+            if handle is not None:
+                handle.cancel()
+                self._idle_handles[index] = None
+
+        self._pantilt._enable_servo1 = False
+        self._pantilt._enable_servo2 = False
+        self._pantilt._set_config()
+        await self._flush()
+
+    async def light_mode(self, mode):
+        """Set the light mode for attached lights.
+
+        :param mode: Either PWM or WS2812
+
+        """
+
+        self._pantilt.light_mode(mode)
+        await self._flush()
+
+    async def brightness(self, brightness):
+        """Set the brightness of PWM dimmed lights.
+
+        :param brightness: Brightness from 0 to 255
+
+        """
+
+        self._pantilt.brightness(brightness)
+        await self._flush()
+
+    async def show(self):
+        """Display the buffer on the connected WS2812 strip."""
+
+        self._pantilt.show()
+        await self._flush()
+
+    async def servo_enable(self, index, state):
+        """Enable or disable a servo.
+
+        :param index: Servo index: either 1 or 2
+        :param state: Servo state: True = on, False = off
+
+        """
+
+        self._pantilt.servo_enable(index, state)
+        await self._flush()
+
+    async def servo_one(self, angle):
+        """Set position of servo 1 in degrees.
+
+        :param angle: Angle in degrees from -90 to 90
+
+        """
+
+        self._pantilt.servo_one(angle)
+        await self._flush()
+
+    async def servo_two(self, angle):
+        """Set position of servo 2 in degrees.
+
+        :param angle: Angle in degrees from -90 to 90
+
+        """
+
+        self._pantilt.servo_two(angle)
+        await self._flush()
+
+    async def servo_one_us(self, us):
+        """Set the pulse time of servo 1 in microseconds.
+
+        :param us: Pulse time in microseconds
+
+        """
+
+        self._pantilt.servo_one_us(us)
+        await self._flush()
+
+    async def servo_two_us(self, us):
+        """Set the pulse time of servo 2 in microseconds.
+
+        :param us: Pulse time in microseconds
+
+        """
+
+        self._pantilt.servo_two_us(us)
+        await self._flush()
+
+    async def pan_tilt(self, pan, tilt):
+        """Set position of both servos in degrees.
+
+        :param pan: Angle of servo 1 in degrees from -90 to 90
+        :param tilt: Angle of servo 2 in degrees from -90 to 90
+
+        """
+
+        self._pantilt.pan_tilt(pan, tilt)
+        await self._flush()
+
+    async def pan_tilt_us(self, us_pan, us_tilt):
+        """Set the pulse time of both servos in microseconds.
+
+        :param us_pan: Pulse time of servo 1 in microseconds
+        :param us_tilt: Pulse time of servo 2 in microseconds
+
+        """
+
+        self._pantilt.pan_tilt_us(us_pan, us_tilt)
+        await self._flush()
+
+    async def _read_servo(self, reg):
+        pantilt = self._pantilt
+        await self.setup()
+
+        if pantilt._shadow.get(reg) is None:
+            us = await self._i2c_retry('read_word_data', (reg,), "Failed to read word")
+            pantilt._shadow[reg] = us
+
+    async def get_servo_one(self, precise=False):
+        """Get position of servo 1 in degrees.
+
+        :param precise: True = return fractional degrees, False = round to whole degrees
+
+        """
+
+        await self._read_servo(self._pantilt.REG_SERVO1)
+        return self._pantilt.get_servo_one(precise)
+
+    async def get_servo_two(self, precise=False):
+        """Get position of servo 2 in degrees.
+
+        :param precise: True = return fractional degrees, False = round to whole degrees
+
+        """
+
+        await self._read_servo(self._pantilt.REG_SERVO2)
+        return self._pantilt.get_servo_two(precise)
+
+    async def wait_until_settled(self):
+        """Wait until the servos should have physically reached their positions."""
+
+        await asyncio.sleep(self._pantilt._servo_unsettled())
+
+    async def pan_and_wait(self, angle):
+        """Set position of servo 1, and wait until it should have got there.
+
+        :param angle: Angle in degrees from -90 to 90
+
+        """
+
+        # Read the starting position, if it isn't known, so the travel time can be estimated
+        await self._read_servo(PanTilt.REG_SERVO1)
+        await self.servo_one(angle)
+        await self.wait_until_settled()
+
+    async def tilt_and_wait(self, angle):
+        """Set position of servo 2, and wait until it should have got there.
+
+        :param angle: Angle in degrees from -90 to 90
+
+        """
+
+        await self._read_servo(PanTilt.REG_SERVO2)
+        await self.servo_two(angle)
+        await self.wait_until_settled()
+
+    async def pan_tilt_and_wait(self, pan, tilt):
+        """Set position of both servos, and wait until they should have got there.
+
+        :param pan: Angle of servo 1 in degrees from -90 to 90
+        :param tilt: Angle of servo 2 in degrees from -90 to 90
+
+        """
+
+        await self._read_servo(PanTilt.REG_SERVO1)
+        await self._read_servo(PanTilt.REG_SERVO2)
+        await self.pan_tilt(pan, tilt)
+        await self.wait_until_settled()
+
+    pan = servo_one
+    tilt = servo_two
+    pan_us = servo_one_us
+    tilt_us = servo_two_us
+    get_pan = get_servo_one
+    get_tilt = get_servo_two
@@ -0,0 +1,478 @@
+from timeit import default_timer as timer
+import colorsys
+import math
+import threading
+import time
+import traceback
+
+
+# CPU time used by the calling thread, so an effect's cost doesn't include time spent waiting for the GIL
+_cpu_time = getattr(time, 'thread_time', None) or getattr(time, 'process_time', None) or timer
+
+
+class Frame:
+    """A frame of pixel colours, in red, green, blue (and white) order
+
+    Effects render into a Frame, which the Animator then hands to
+    PanTilt.set_pixels, so effects never need to know the light type.
+
+    """
+
+    def __init__(self, count, channels=3):
+        """Create a blank frame.
+
+        :param count: Number of pixels
+        :param channels: 3 for RGB pixels, or 4 for RGBW
+
+        """
+
+        self.count = count
+        self.channels = channels
+        self.data = bytearray(count * channels)
+
+    def __len__(self):
+        return self.count
+
+    def __setitem__(self, index, colour):
+        """Set a pixel to a (red, green, blue[, white]) colour."""
+
+        start = index * self.channels
+        colour = colour[:self.channels]
+        self.data[start:start + len(colour)] = bytearray(colour)
+
+    def __getitem__(self, index):
+        start = index * self.channels
+        return tuple(self.data[start:start + self.channels])
+
+    def fill(self, colour):
+        """Set every pixel to a (red, green, blue[, white]) colour."""
+
+        colour = tuple(colour[:self.channels]) + (0,) * (self.channels - len(colour))
+        self.data[:] = bytearray(colour) * self.count
+
+    def copy_from(self, frame):
+        """Copy the pixels of another frame, or anything PanTilt.set_pixels would accept as a buffer."""
+
+        data = frame.data if isinstance(frame, Frame) else bytearray(frame)
+        if len(data) != len(self.data):
+            raise ValueError("Frame should be {length} bytes".format(length=len(self.data)))
+        self.data[:] = data
+
+
+class Effect:
+    """Base class for animated effects
+
+    Subclasses implement render, which draws the effect at a point in time.
+
+    """
+
+    def render(self, frame, t):
+        """Draw the effect into a frame.
+
+        :param frame: Frame to draw into
+        :param t: Time in seconds since the Animator started
+
+        """
+
+        raise NotImplementedError
+
+
+class _Callback(Effect):
+    """Effect for a function called as callback(frame, t)."""
+
+    def __init__(self, callback):
+        self._callback = callback
+
+    def render(self, frame, t):
+        self._callback(frame, t)
+
+
+class _Generator(Effect):
+    """Effect for an iterator that yields a whole frame each time."""
+
+    def __init__(self, iterator):
+        self._iterator = iterator
+
+    def render(self, frame, t):
+        rendered = next(self._iterator, None)
+        if rendered is None:
+            raise StopIteration
+
+        if isinstance(rendered, (Frame, bytes, bytearray, memoryview)):
+            frame.copy_from(rendered)
+        else:
+            for index, colour in enumerate(rendered):
+                frame[index] = colour
+
+
+def as_effect(effect):
+    """Returns an Effect for an Effect, a callback(frame, t), or an iterator of frames."""
+
+    if isinstance(effect, Effect):
+        return effect
+
+    if hasattr(effect, '__next__') or hasattr(effect, 'next'):
+        return _Generator(effect)
+
+    if callable(effect):
+        return _Callback(effect)
+
+    raise ValueError("Effect should be an Effect, a callable or an iterator")
+
+
+class Rainbow(Effect):
+    """Hues cycling around the pixels"""
+
+    def __init__(self, speed=0.2, spread=1.0, brightness=1.0):
+        """Create a rainbow.
+
+        :param speed: Trips around the colour wheel per second
+        :param spread: How many times the colour wheel fits along the pixels
+        :param brightness: Brightness from 0.0 to 1.0
+
+        """
+
+        self.speed = speed
+        self.spread = spread
+        self.brightness = brightness
+
+    def render(self, frame, t):
+        count = len(frame)
+        for index in range(count):
+            hue = (t * self.speed + index * self.spread / count) % 1.0
+            frame[index] = tuple(int(c * 255) for c in colorsys.hsv_to_rgb(hue, 1.0, self.brightness))
+
+
+class Breathe(Effect):
+    """Every pixel slowly fading up and down"""
+
+    def __init__(self, colour, period=4.0):
+        """Create a breathing effect.
+
+        :param colour: (red, green, blue[, white]) colour at full brightness
+        :param period: Seconds per breath
+
+        """
+
+        self.colour = colour
+        self.period = period
+
+    def render(self, frame, t):
+        level = (1 - math.cos(t * 2 * math.pi / self.period)) / 2
+        frame.fill(tuple(int(c * level) for c in self.colour))
+
+
+class Chase(Effect):
+    """A group of lit pixels running around the strip"""
+
+    def __init__(self, colour, length=3, speed=12.0, background=(0, 0, 0)):
+        """Create a chase.
+
+        :param colour: (red, green, blue[, white]) colour of the lit pixels
+        :param length: Number of lit pixels
+        :param speed: Pixels per second
+        :param background: (red, green, blue[, white]) colour of the other pixels
+
+        """
+
+        self.colour = colour
+        self.length = length
+        self.speed = speed
+        self.background = background
+
+    def render(self, frame, t):
+        count = len(frame)
+        head = int(t * self.speed) % count
+        frame.fill(self.background)
+        for offset in range(self.length):
+            frame[(head - offset) % count] = self.colour
+
+
+class Flash(Effect):
+    """Every pixel flashing on and off"""
+
+    def __init__(self, colour, rate=2.0, duty=0.5, background=(0, 0, 0)):
+        """Create a flashing effect.
+
+        :param colour: (red, green, blue[, white]) colour when on
+        :param rate: Flashes per second
+        :param duty: Fraction of each flash spent on, from 0.0 to 1.0
+        :param background: (red, green, blue[, white]) colour when off
+
+        """
+
+        self.colour = colour
+        self.rate = rate
+        self.duty = duty
+        self.background = background
+
+    def render(self, frame, t):
+        frame.fill(self.colour if (t * self.rate) % 1.0 < self.duty else self.background)
+
+
+class Blend(Effect):
+    """Two effects mixed together
+
+    Mixes in a fixed proportion, or if duration is given, fades from
+    the first effect to the second over that many seconds. If the first
+    effect runs out, the blend carries on with the second alone.
+
+    """
+
+    def __init__(self, first, second, mix=0.5, duration=None):
+        """Create a blend.
+
+        :param first: First effect
+        :param second: Second effect
+        :param mix: Proportion of the second effect, from 0.0 to 1.0
+        :param duration: Time in seconds to fade from first to second, instead of a fixed mix
+
+        """
+
+        self.first = as_effect(first)
+        self.second = as_effect(second)
+        self.mix = mix
+        self.duration = duration
+        self._started = None
+        self._frames = None
+        self._exhausted = False
+
+    def finished(self, t):
+        """Returns True once a fade has completed, or the first effect has run out."""
+
+        if self._exhausted:
+            return True
+
+        return self.duration is not None and self._started is not None and t - self._started >= self.duration
+
+    def render(self, frame, t):
+        if self._exhausted:
+            self.second.render(frame, t)
+            return
+
+        if self._frames is None or self._frames[0].count != frame.count or self._frames[0].channels != frame.channels:
+            self._frames = (Frame(frame.count, frame.channels), Frame(frame.count, frame.channels))
+
+        mix = self.mix
+        if self.duration is not None:
+            if self._started is None:
+                self._started = t
+            mix = min(1.0, (t - self._started) / self.duration) if self.duration > 0 else 1.0
+
+        first, second = self._frames
+        if mix < 1.0:
+            try:
+                self.first.render(first, t)
+            except StopIteration:
+                self._exhausted = True
+                self.second.render(frame, t)
+                return
+        if mix > 0.0:
+            self.second.render(second, t)
+
+        keep = 1.0 - mix
+        frame.data[:] = bytearray(
+            int(a * keep + b * mix + 0.5) for a, b in zip(first.data, second.data))
+
+
+class AnimationStats:
+    """Statistics for an Animator
+
+    * frames - frames shown
+    * missed - frames skipped because the previous frame ran late
+    * errors - frames that failed to send because of an i2c error
+    * frame_time_mean / frame_time_max - time to render and send a frame, in seconds
+    * effect_time_mean / effect_time_max - CPU time used by the effect's render, in seconds
+
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.missed = 0
+        self.errors = 0
+        self.frame_time_mean = 0.0
+        self.frame_time_max = 0.0
+        self.effect_time_mean = 0.0
+        self.effect_time_max = 0.0
+
+    def _record(self, frame_time, effect_time):
+        self.frames += 1
+        self.frame_time_mean += (frame_time - self.frame_time_mean) / self.frames
+        self.frame_time_max = max(self.frame_time_max, frame_time)
+        self.effect_time_mean += (effect_time - self.effect_time_mean) / self.frames
+        self.effect_time_max = max(self.effect_time_max, effect_time)
+
+    def as_dict(self):
+        """Returns the statistics as a dictionary."""
+
+        return {
+            'frames': self.frames,
+            'missed': self.missed,
+            'errors': self.errors,
+            'frame_time_mean': self.frame_time_mean,
+            'frame_time_max': self.frame_time_max,
+            'effect_time_mean': self.effect_time_mean,
+            'effect_time_max': self.effect_time_max}
+
+
+class Animator:
+    """Runs LED effects at a fixed frame rate
+
+    A single background thread renders the current effect into a back
+    buffer, swaps it with the front buffer, and sends the front buffer
+    to the LEDs with PanTilt.set_pixels and show::
+
+        animator = Animator(pantilthat.pantilthat, fps=30)
+        animator.play(Rainbow())
+        animator.play(Breathe((0, 0, 255)), fade=1.0)
+
+    If a frame runs late, the frames it overran are skipped and counted
+    as missed, rather than letting the animation fall behind.
+
+    """
+
+    def __init__(self, pantilt, fps=30):
+        """Create an animator.
+
+        :param pantilt: PanTilt instance whose LEDs to animate
+        :param fps: Frames per second
+
+        """
+
+        if fps <= 0:
+            raise ValueError("fps should be greater than 0")
+
+        self._pantilt = pantilt
+        self._period = 1.0 / fps
+        self._condition = threading.Condition()
+        self._effect = None
+        self._running = False
+        self._thread = None
+        self._start = None
+        self._front = None
+        self._back = None
+        self.stats = AnimationStats()
+
+    def play(self, effect, fade=0):
+        """Start playing an effect, replacing the current one.
+
+        :param effect: An Effect, a callback(frame, t), or an iterator yielding frames
+        :param fade: Time in seconds to fade from the current effect
+
+        """
+
+        effect = as_effect(effect)
+
+        with self._condition:
+            if fade > 0 and self._effect is not None:
+                effect = Blend(self._effect, effect, duration=fade)
+
+            self._effect = effect
+
+            if self._thread is None:
+                self._running = True
+                self._start = timer()
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+            self._condition.notify()
+
+    def stop(self, clear=True):
+        """Stop the animation and its background thread.
+
+        :param clear: True = turn the LEDs off, False = leave the last frame showing
+
+        """
+
+        with self._condition:
+            thread, self._thread = self._thread, None
+            self._running = False
+            self._effect = None
+            self._condition.notify()
+
+        if thread is not None:
+            thread.join()
+
+        if clear:
+            self._pantilt.clear()
+            self._pantilt.show()
+
+    def frame(self):
+        """Returns a copy of the frame most recently sent to the LEDs, or None."""
+
+        with self._condition:
+            if self._front is None:
+                return None
+            frame = Frame(self._front.count, self._front.channels)
+            frame.copy_from(self._front)
+            return frame
+
+    def _run(self):
+        next_tick = timer()
+
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+                effect = self._effect
+
+            started = timer()
+            t = started - self._start
+
+            count = self._pantilt.num_pixels()
+            channels = self._pantilt._pixel_stride
+            if self._back is None or self._back.count != count or self._back.channels != channels:
+                self._back = Frame(count, channels)
+
+            cpu_started = _cpu_time()
+            try:
+                effect.render(self._back, t)
+            except StopIteration:
+                with self._condition:
+                    # Replaced by play() while rendering, so carry on with the new effect
+                    if self._effect is not effect:
+                        continue
+                    self._effect = None
+                    self._running = False
+                    self._thread = None
+                return
+            except Exception:
+                traceback.print_exc()
+                with self._condition:
+                    if self._effect is not effect:
+                        continue
+                    self._running = False
+                    self._thread = None
+                return
+
+            effect_time = _cpu_time() - cpu_started
+
+            if isinstance(effect, Blend) and effect.finished(t):
+                with self._condition:
+                    if self._effect is effect:
+                        self._effect = effect.second
+
+            with self._condition:
+                self._front, self._back = self._back, self._front
+
+            try:
+                self._pantilt.set_pixels(self._front.data)
+                self._pantilt.show()
+            except IOError:
+                self.stats.errors += 1
+
+            self.stats._record(timer() - started, effect_time)
+
+            next_tick += self._period
+            delay = next_tick - timer()
+            missed = int(-delay / self._period) if delay < 0 else 0
+            if missed:
+                # Skip the frames we've overrun, rather than trying to catch up
+                self.stats.missed += missed
+                next_tick += missed * self._period
+                delay = next_tick - timer()
+
+            with self._condition:
+                if self._running and delay > 0:
+                    self._condition.wait(delay)
@@ -0,0 +1,154 @@
+"""Benchmarks for the PanTilt HAT library hot paths.
+
+Run with::
+
+    python -m pantilthat.bench --output results.json
+
+Each benchmark drives a PanTilt connected to a SimulatedHAT, so no
+hardware is needed, and reports calls per second, CPU time per call,
+peak memory allocated and i2c transactions per call.
+
+"""
+
+from timeit import default_timer as timer
+import platform
+import time
+import tracemalloc
+
+from .. import __version__
+from ..pantilt import PanTilt
+from ..simulator import SimulatedHAT
+
+
+def _pantilt():
+    hat = SimulatedHAT()
+    pantilt = PanTilt(idle_timeout=0, i2c_bus=hat)
+    pantilt.setup()
+    return pantilt, hat
+
+
+def bench_set_pixel(pantilt):
+    def call(i):
+        pantilt.set_pixel(i % 24, i & 0xff, 0, 255)
+    return call
+
+
+def bench_set_all(pantilt):
+    def call(i):
+        pantilt.set_all(i & 0xff, 0, 255)
+    return call
+
+
+def bench_set_pixels(pantilt):
+    frames = [bytes(bytearray([i, 0, 255] * 24)) for i in range(256)]
+
+    def call(i):
+        pantilt.set_pixels(frames[i & 0xff])
+    return call
+
+
+def bench_show(pantilt):
+    def call(i):
+        pantilt.set_pixel(0, i & 0xff, 0, 0)
+        pantilt.show()
+    return call
+
+
+def bench_servo_one(pantilt):
+    def call(i):
+        pantilt.servo_one((i % 181) - 90)
+    return call
+
+
+def bench_servo_two(pantilt):
+    def call(i):
+        pantilt.servo_two((i % 181) - 90)
+    return call
+
+
+def bench_pan_tilt(pantilt):
+    def call(i):
+        pantilt.pan_tilt((i % 181) - 90, 90 - (i % 181))
+    return call
+
+
+def bench_servo_to_us(pantilt):
+    def call(i):
+        pantilt._servo_to_us(0, (i % 181) - 90)
+    return call
+
+
+BENCHMARKS = {
+    'set_pixel': bench_set_pixel,
+    'set_all': bench_set_all,
+    'set_pixels': bench_set_pixels,
+    'show': bench_show,
+    'servo_one': bench_servo_one,
+    'servo_two': bench_servo_two,
+    'pan_tilt': bench_pan_tilt,
+    '_servo_to_us': bench_servo_to_us,
+}
+
+
+def run_benchmark(name, iterations=10000):
+    """Run a single benchmark and return its results.
+
+    :param name: Name of the benchmark, a key of BENCHMARKS
+    :param iterations: Number of calls to time
+
+    """
+
+    pantilt, hat = _pantilt()
+    call = BENCHMARKS[name](pantilt)
+
+    # Warm up, and make sure the first call's setup isn't counted
+    call(0)
+
+    transactions = hat.transactions
+    bus_time = hat.bus_time
+    wall_start = timer()
+    cpu_start = time.process_time()
+    for i in range(iterations):
+        call(i)
+    cpu = time.process_time() - cpu_start
+    wall = timer() - wall_start
+    transactions = hat.transactions - transactions
+    bus_time = hat.bus_time - bus_time
+
+    # Allocations are measured separately, since tracing slows everything down
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for i in range(min(iterations, 1000)):
+        call(i)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'calls_per_second': iterations / wall if wall > 0 else None,
+        'wall_us_per_call': wall * 1000000 / iterations,
+        'cpu_us_per_call': cpu * 1000000 / iterations,
+        'peak_alloc_bytes': peak,
+        'i2c_transactions_per_call': float(transactions) / iterations,
+        'i2c_bus_time_us_per_call': bus_time * 1000000 / iterations,
+    }
+
+
+def run(names=None, iterations=10000):
+    """Run benchmarks and return the results, ready to be saved as json.
+
+    :param names: List of benchmark names to run, default all
+    :param iterations: Number of calls to time for each benchmark
+
+    """
+
+    if names is None:
+        names = sorted(BENCHMARKS.keys())
+
+    return {
+        'pantilthat': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'results': dict((name, run_benchmark(name, iterations)) for name in names),
+    }
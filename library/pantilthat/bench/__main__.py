@@ -0,0 +1,33 @@
+import argparse
+import json
+import sys
+
+from . import BENCHMARKS, run
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='python -m pantilthat.bench',
+                                     description='Benchmark the PanTilt HAT library against a simulated HAT.')
+    parser.add_argument('benchmarks', nargs='*',
+                        help='Benchmarks to run, default all: {}'.format(', '.join(sorted(BENCHMARKS.keys()))))
+    parser.add_argument('-n', '--iterations', type=int, default=10000,
+                        help='Calls to time for each benchmark, default 10000')
+    parser.add_argument('-o', '--output', help='Write json results to this file instead of stdout')
+    args = parser.parse_args(args)
+
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark: {}".format(name))
+
+    results = run(args.benchmarks or None, args.iterations)
+    output = json.dumps(results, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
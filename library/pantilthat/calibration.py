@@ -0,0 +1,201 @@
+from bisect import bisect_right
+import struct
+import time
+
+
+MAGIC = b'PTC1'
+_HEADER = struct.Struct('<4sH')
+_POINT = struct.Struct('<ff')
+
+
+class Calibration:
+    """Measured angle to pulse mapping for a servo
+
+    Hobby servos are rarely linear, especially near the ends of their
+    travel. A Calibration holds a table of measured (angle, pulse) points
+    and converts between the two by interpolating between neighbouring points.
+
+    Use with PanTilt.servo_calibration::
+
+        cal = Calibration([(-90, 600), (-45, 1010), (0, 1460), (45, 1890), (90, 2280)])
+        pantilthat.servo_calibration(1, cal)
+
+    """
+
+    def __init__(self, points):
+        """Create a calibration from a table of points.
+
+        :param points: Iterable of (angle, pulse) pairs; angles in degrees and pulses in microseconds
+
+        """
+
+        points = sorted((float(angle), float(us)) for angle, us in points)
+
+        if len(points) < 2:
+            raise ValueError("Calibration needs at least two points")
+
+        self.angles = [angle for angle, us in points]
+        self.pulses = [us for angle, us in points]
+
+        rising = self.pulses[-1] > self.pulses[0]
+        for index in range(1, len(points)):
+            if self.angles[index] == self.angles[index - 1]:
+                raise ValueError("Calibration angles should be unique")
+            if (self.pulses[index] > self.pulses[index - 1]) != rising or self.pulses[index] == self.pulses[index - 1]:
+                raise ValueError("Calibration pulses should change steadily with angle")
+
+        # Precompute the slope of each segment, so lookups are a bisect and a multiply
+        self._us_per_degree = [
+            (self.pulses[index + 1] - self.pulses[index]) / (self.angles[index + 1] - self.angles[index])
+            for index in range(len(points) - 1)]
+
+        # Pulses sorted ascending, for reverse lookups
+        self._sorted_pulses = self.pulses if rising else self.pulses[::-1]
+        self._sorted_angles = self.angles if rising else self.angles[::-1]
+
+    @classmethod
+    def linear(cls, us_min, us_max):
+        """Create a calibration equivalent to PanTilt's default linear mapping.
+
+        :param us_min: Pulse time at -90 degrees in microseconds
+        :param us_max: Pulse time at 90 degrees in microseconds
+
+        """
+
+        return cls([(-90, us_min), (90, us_max)])
+
+    def pulse_range(self):
+        """Returns the (minimum, maximum) pulse times in the table."""
+
+        return (self._sorted_pulses[0], self._sorted_pulses[-1])
+
+    def to_us(self, angle):
+        """Converts degrees into a pulse time in microseconds.
+
+        :param angle: Angle in degrees, within the calibrated range
+
+        """
+
+        angles = self.angles
+        if angle < angles[0] or angle > angles[-1]:
+            raise ValueError("Value {value} should be between {min} and {max}".format(
+                value=angle,
+                min=angles[0],
+                max=angles[-1]))
+
+        index = min(bisect_right(angles, angle), len(angles) - 1) - 1
+        return self.pulses[index] + (angle - angles[index]) * self._us_per_degree[index]
+
+    def to_degrees(self, us):
+        """Converts a pulse time in microseconds into degrees.
+
+        :param us: Pulse time in microseconds, within the calibrated range
+
+        """
+
+        pulses = self._sorted_pulses
+        if us < pulses[0] or us > pulses[-1]:
+            raise ValueError("Value {value} should be between {min} and {max}".format(
+                value=us,
+                min=pulses[0],
+                max=pulses[-1]))
+
+        angles = self._sorted_angles
+        index = min(bisect_right(pulses, us), len(pulses) - 1) - 1
+        return angles[index] + (us - pulses[index]) * (angles[index + 1] - angles[index]) / (pulses[index + 1] - pulses[index])
+
+    def to_us_many(self, angles):
+        """Converts many angles into pulse times at once.
+
+        With NumPy installed, angles may be any array-like and a NumPy
+        array of floats is returned. Without it, a list is returned.
+
+        :param angles: Sequence of angles in degrees, within the calibrated range
+
+        """
+
+        try:
+            import numpy
+        except ImportError:
+            return [self.to_us(angle) for angle in angles]
+
+        angles = numpy.asarray(angles, dtype=float)
+        if angles.size and (angles.min() < self.angles[0] or angles.max() > self.angles[-1]):
+            raise ValueError("Angles should be between {min} and {max}".format(
+                min=self.angles[0],
+                max=self.angles[-1]))
+
+        return numpy.interp(angles, self.angles, self.pulses)
+
+    def save(self, file):
+        """Save the calibration table.
+
+        The file is a 6 byte header followed by 8 bytes per point.
+
+        :param file: Filename, or a file opened in binary mode
+
+        """
+
+        data = _HEADER.pack(MAGIC, len(self.angles))
+        data += b''.join(_POINT.pack(angle, us) for angle, us in zip(self.angles, self.pulses))
+
+        if hasattr(file, 'write'):
+            file.write(data)
+        else:
+            with open(file, 'wb') as f:
+                f.write(data)
+
+    @classmethod
+    def load(cls, file):
+        """Load a calibration table saved with save().
+
+        :param file: Filename, or a file opened in binary mode
+
+        """
+
+        if hasattr(file, 'read'):
+            data = file.read()
+        else:
+            with open(file, 'rb') as f:
+                data = f.read()
+
+        magic, count = _HEADER.unpack_from(data)
+        if magic != MAGIC or len(data) != _HEADER.size + count * _POINT.size:
+            raise ValueError("Not a PanTilt HAT calibration file")
+
+        return cls(_POINT.unpack_from(data, _HEADER.size + index * _POINT.size) for index in range(count))
+
+
+def calibrate(pantilt, index, measure, pulses=None, settle=0.5):
+    """Build a calibration table by moving a servo and measuring where it went.
+
+    The servo is moved to each pulse time in turn, and measure is
+    called to find out the angle it actually reached; for example by
+    asking the user to read a protractor, or from a camera.
+
+    Returns a Calibration.
+
+    :param pantilt: PanTilt instance
+    :param index: Servo index: either 1 or 2
+    :param measure: Function called as measure(pulse) that returns the measured angle in degrees
+    :param pulses: Pulse times to measure at, default 9 evenly spaced across the current pulse range
+    :param settle: Time in seconds to let the servo settle before measuring
+
+    """
+
+    if index not in [1, 2]:
+        raise ValueError("Servo index must be 1 or 2")
+
+    if pulses is None:
+        us_min, us_max = pantilt._servo_range(index - 1)
+        pulses = [int(round(us_min + (us_max - us_min) * step / 8.0)) for step in range(9)]
+
+    move = pantilt.servo_one_us if index == 1 else pantilt.servo_two_us
+
+    points = []
+    for us in pulses:
+        move(us)
+        time.sleep(settle)
+        points.append((measure(us), us))
+
+    return Calibration(points)
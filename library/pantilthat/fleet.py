@@ -0,0 +1,233 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer as timer
+import threading
+
+from .pantilt import PanTilt
+from .transport import Transport, SMBusTransport, SMBus2Transport
+
+
+class SharedBus(Transport):
+    """Transport shared by several devices on one i2c bus
+
+    Holds a lock for each transfer, so transfers from the fleet's bus
+    worker, idle timeouts and background writers never interleave.
+
+    """
+
+    def __init__(self, bus):
+        """Wrap a transport for sharing.
+
+        :param bus: A Transport, or an SMBus compatible object
+
+        """
+
+        if not isinstance(bus, Transport):
+            bus = SMBusTransport(bus)
+
+        self._bus = bus
+        self._lock = threading.Lock()
+
+    def write_i2c_block_data(self, addr, reg, data):
+        with self._lock:
+            self._bus.write_i2c_block_data(addr, reg, data)
+
+    def write_word_data(self, addr, reg, data):
+        with self._lock:
+            self._bus.write_word_data(addr, reg, data)
+
+    def write_byte_data(self, addr, reg, data):
+        with self._lock:
+            self._bus.write_byte_data(addr, reg, data)
+
+    def read_byte_data(self, addr, reg):
+        with self._lock:
+            return self._bus.read_byte_data(addr, reg)
+
+    def read_word_data(self, addr, reg):
+        with self._lock:
+            return self._bus.read_word_data(addr, reg)
+
+    def write_many(self, addr, writes):
+        with self._lock:
+            self._bus.write_many(addr, writes)
+
+
+class Fleet:
+    """Drives many PanTilt HATs across one or more i2c buses
+
+    Each bus gets a single worker thread, so devices on different buses
+    are driven in parallel while devices sharing a bus take turns::
+
+        fleet = Fleet()
+        fleet.add('left', bus=1, address=0x15)
+        fleet.add('right', bus=3, address=0x15)
+        fleet.move({'left': (45, 0), 'right': (-45, 0)})
+        print(fleet.latency())
+
+    """
+
+    def __init__(self):
+        self._devices = OrderedDict()
+        self._device_bus = {}
+        self._buses = {}
+        self._workers = {}
+        self._latency = {}
+        self._lock = threading.Lock()
+
+    def _open_bus(self, bus):
+        try:
+            from smbus import SMBus
+            return SMBusTransport(SMBus(bus))
+        except ImportError:
+            return SMBus2Transport(bus)
+
+    def add(self, name, bus=1, address=0x15, i2c_bus=None, **kwargs):
+        """Add a PanTilt HAT to the fleet.
+
+        Returns the new PanTilt instance.
+
+        :param name: Name to refer to the device by
+        :param bus: i2c bus number, or any other name for the bus the device is on
+        :param address: i2c address of the device
+        :param i2c_bus: Transport or SMBus compatible object for the bus, the first device on a bus opens bus number bus if not given
+        :param kwargs: Any other argument accepted by PanTilt
+
+        """
+
+        with self._lock:
+            if name in self._devices:
+                raise ValueError("Device {name} is already in the fleet".format(name=name))
+
+            shared = self._buses.get(bus)
+            if shared is None:
+                shared = SharedBus(i2c_bus if i2c_bus is not None else self._open_bus(bus))
+                self._buses[bus] = shared
+                self._workers[bus] = ThreadPoolExecutor(max_workers=1)
+
+            for other in self._devices:
+                if self._device_bus[other] == bus and self._devices[other]._i2c_address == address:
+                    raise ValueError("Address 0x{address:02x} is already used on bus {bus}".format(address=address, bus=bus))
+
+            pantilt = PanTilt(address=address, i2c_bus=shared, **kwargs)
+
+            self._devices[name] = pantilt
+            self._device_bus[name] = bus
+            self._latency[name] = {'calls': 0, 'errors': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0}
+
+            return pantilt
+
+    def names(self):
+        """Returns the names of the devices in the fleet."""
+
+        return list(self._devices)
+
+    def __getitem__(self, name):
+        return self._devices[name]
+
+    def _timed(self, name, method, args):
+        pantilt = self._devices[name]
+        start = timer()
+        error = False
+
+        try:
+            return getattr(pantilt, method)(*args)
+        except Exception:
+            error = True
+            raise
+        finally:
+            latency = timer() - start
+            with self._lock:
+                record = self._latency[name]
+                record['calls'] += 1
+                record['errors'] += error
+                record['total'] += latency
+                record['max'] = max(record['max'], latency)
+                record['last'] = latency
+
+    def submit(self, name, method, *args):
+        """Call a PanTilt method on a device, from its bus worker.
+
+        Returns a concurrent.futures.Future for the result.
+
+        :param name: Device name
+        :param method: Name of the PanTilt method, eg: 'pan_tilt'
+        :param args: Arguments for the method
+
+        """
+
+        if name not in self._devices:
+            raise KeyError("No device named {name}".format(name=name))
+
+        return self._workers[self._device_bus[name]].submit(self._timed, name, method, args)
+
+    def call(self, commands, wait=True):
+        """Call methods on many devices at once.
+
+        Commands for devices on different buses run in parallel. If wait is
+        True, returns a dictionary of device name to result once every
+        command has finished, raising the first error if any failed.
+        Otherwise returns a dictionary of device name to Future.
+
+        :param commands: Dictionary of device name to (method, args) tuple
+        :param wait: True = wait for every command to finish
+
+        """
+
+        futures = OrderedDict(
+            (name, self.submit(name, method, *args)) for name, (method, args) in commands.items())
+
+        if not wait:
+            return futures
+
+        # Wait for everything, so a failure doesn't leave other devices mid-command
+        errors = [future.exception() for future in futures.values()]
+        for error in errors:
+            if error is not None:
+                raise error
+
+        return OrderedDict((name, future.result()) for name, future in futures.items())
+
+    def move(self, positions, wait=True):
+        """Move many devices at once.
+
+        :param positions: Dictionary of device name to (pan, tilt) angles in degrees
+        :param wait: True = wait for every device to be sent its new position
+
+        """
+
+        return self.call(OrderedDict(
+            (name, ('pan_tilt', tuple(position))) for name, position in positions.items()), wait)
+
+    def move_all(self, pan, tilt, wait=True):
+        """Move every device in the fleet to the same position.
+
+        :param pan: Angle of servo 1 in degrees from -90 to 90
+        :param tilt: Angle of servo 2 in degrees from -90 to 90
+        :param wait: True = wait for every device to be sent its new position
+
+        """
+
+        return self.move(OrderedDict((name, (pan, tilt)) for name in self._devices), wait)
+
+    def latency(self):
+        """Returns per-device command statistics.
+
+        For each device name: the number of commands run and failed, and the
+        mean, maximum and most recent time spent running a command, in seconds.
+
+        """
+
+        with self._lock:
+            return dict((name, {
+                'calls': record['calls'],
+                'errors': record['errors'],
+                'latency_mean': record['total'] / record['calls'] if record['calls'] else 0.0,
+                'latency_max': record['max'],
+                'latency_last': record['last']}) for name, record in self._latency.items())
+
+    def close(self):
+        """Wait for outstanding commands, then stop the bus workers."""
+
+        for worker in self._workers.values():
+            worker.shutdown(wait=True)
@@ -0,0 +1,125 @@
+import threading
+
+
+class BusStats:
+    """i2c bus statistics
+
+    Counts calls, bytes, retries and failures for each i2c operation
+    and register, and keeps a latency histogram for each.
+
+    Histogram buckets are powers of two in microseconds: a call taking
+    150us is counted in the 256 bucket, which holds calls from 128us to 256us.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ops = {}
+
+    def reset(self):
+        """Clear all statistics."""
+
+        with self._lock:
+            self._ops = {}
+
+    def record(self, op, reg, length, retries, failed, latency):
+        """Record a single i2c call.
+
+        :param op: Name of the operation, eg: write_word_data
+        :param reg: Register the operation started at
+        :param length: Number of data bytes transferred
+        :param retries: Number of attempts after the first
+        :param failed: True if the call gave up
+        :param latency: Time taken in seconds, including retries
+
+        """
+
+        us = int(latency * 1000000)
+        bucket = 1
+        while bucket < us:
+            bucket <<= 1
+
+        with self._lock:
+            entry = self._ops.get((op, reg))
+            if entry is None:
+                entry = self._ops[(op, reg)] = {
+                    'calls': 0,
+                    'bytes': 0,
+                    'retries': 0,
+                    'failures': 0,
+                    'latency_total_us': 0,
+                    'latency_max_us': 0,
+                    'histogram_us': {}}
+
+            entry['calls'] += 1
+            entry['retries'] += retries
+            if failed:
+                entry['failures'] += 1
+            else:
+                entry['bytes'] += length
+            entry['latency_total_us'] += us
+            entry['latency_max_us'] = max(entry['latency_max_us'], us)
+            entry['histogram_us'][bucket] = entry['histogram_us'].get(bucket, 0) + 1
+
+    def snapshot(self):
+        """Returns a copy of the statistics.
+
+        The result is a dictionary keyed by "operation:register",
+        eg: "write_word_data:0x01", and contains only plain values
+        so it can be serialised with json.
+
+        """
+
+        with self._lock:
+            result = {}
+            for (op, reg), entry in self._ops.items():
+                entry = dict(entry)
+                entry['histogram_us'] = dict(entry['histogram_us'])
+                result["{op}:0x{reg:02x}".format(op=op, reg=reg)] = entry
+
+            return result
+
+
+def describe(method, args):
+    """Returns the starting register and number of data bytes for an i2c call.
+
+    :param method: Name of the transport method
+    :param args: Arguments to the method, after the i2c address
+
+    """
+
+    if method == 'write_many':
+        return args[0][0][0], sum(len(data) for reg, data in args[0])
+
+    if method == 'write_i2c_block_data':
+        return args[0], len(args[1])
+
+    if method in ('write_word_data', 'read_word_data'):
+        return args[0], 2
+
+    return args[0], 1
+
+
+def flatten(snapshot, prefix='pantilthat'):
+    """Flatten a statistics snapshot into metric names and values.
+
+    Nested keys are joined with underscores, and characters that
+    metrics systems commonly reject are replaced, eg::
+
+        pantilthat_bus_write_word_data_0x01_calls
+
+    :param snapshot: Dictionary returned by PanTilt.stats()
+    :param prefix: Prefix for all metric names
+
+    """
+
+    result = {}
+
+    for key, value in snapshot.items():
+        name = "{prefix}_{key}".format(prefix=prefix, key=key).replace(':', '_').replace('-', '_')
+        if isinstance(value, dict):
+            result.update(flatten(value, name))
+        else:
+            result[name] = value
+
+    return result
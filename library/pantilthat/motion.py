@@ -0,0 +1,434 @@
+from timeit import default_timer as timer
+import math
+import threading
+import time
+
+
+TRAPEZOID = 0
+SCURVE = 1
+
+MERGE = 0
+DROP = 1
+
+
+class Profile:
+    """Motion profile for a single axis
+
+    Plans a move from rest to rest, accelerating up to a maximum
+    speed, cruising, then decelerating to a stop at the target.
+
+    A TRAPEZOID profile uses constant acceleration. An SCURVE
+    profile ramps the acceleration smoothly up and down, which is
+    gentler on the servo and payload but takes a little longer.
+
+    If the move is too short to reach max_speed, it accelerates
+    for half of the distance and decelerates for the rest.
+
+    """
+
+    def __init__(self, start, end, max_speed, accel, shape=TRAPEZOID):
+        """Plan a move.
+
+        :param start: Start position in degrees
+        :param end: End position in degrees
+        :param max_speed: Maximum speed in degrees per second
+        :param accel: Maximum acceleration in degrees per second squared
+        :param shape: Either TRAPEZOID or SCURVE
+
+        """
+
+        if max_speed <= 0 or accel <= 0:
+            raise ValueError("max_speed and accel should be greater than 0")
+
+        if shape not in [TRAPEZOID, SCURVE]:
+            raise ValueError("shape must be TRAPEZOID or SCURVE")
+
+        self.start = start
+        self.end = end
+        self.shape = shape
+
+        distance = abs(end - start)
+        self._direction = 1 if end >= start else -1
+        self._distance = distance
+
+        # An S-curve's average acceleration during a ramp is half its peak
+        accel = accel if shape == TRAPEZOID else accel / 2.0
+
+        speed = max_speed
+        ramp_time = speed / accel
+        ramp_distance = speed * ramp_time / 2.0
+
+        if ramp_distance * 2 > distance:
+            speed = math.sqrt(distance * accel)
+            ramp_time = speed / accel
+            ramp_distance = distance / 2.0
+
+        self.speed = speed
+        self._ramp_time = ramp_time
+        self._ramp_distance = ramp_distance
+        self._cruise_time = (distance - ramp_distance * 2) / speed if speed > 0 else 0
+        self.duration = ramp_time * 2 + self._cruise_time
+
+    def _ramp(self, t):
+        """Distance covered t seconds into the acceleration ramp."""
+
+        if self._ramp_time <= 0:
+            return 0.0
+
+        if self.shape == TRAPEZOID:
+            return self.speed * t * t / (2.0 * self._ramp_time)
+
+        u = t / self._ramp_time
+        return self.speed * self._ramp_time * (u * u / 2.0 + (math.cos(2 * math.pi * u) - 1) / (4 * math.pi * math.pi))
+
+    def position(self, t):
+        """Returns the position in degrees t seconds after the start of the move.
+
+        :param t: Time in seconds
+
+        """
+
+        if t <= 0:
+            return self.start
+
+        if t >= self.duration:
+            return self.end
+
+        if t < self._ramp_time:
+            distance = self._ramp(t)
+        elif t < self._ramp_time + self._cruise_time:
+            distance = self._ramp_distance + self.speed * (t - self._ramp_time)
+        else:
+            distance = self._distance - self._ramp(self.duration - t)
+
+        return self.start + distance * self._direction
+
+
+class MoveHandle:
+    """Handle for a move started by MotionController.move_to"""
+
+    def __init__(self, duration):
+        self.duration = duration
+        self._event = threading.Event()
+        self._cancelled = False
+        self._error = None
+
+    def _finish(self, error=None):
+        self._error = error
+        self._event.set()
+
+    def done(self):
+        """Returns True if the move has finished, been cancelled or failed."""
+
+        return self._event.is_set()
+
+    def cancelled(self):
+        """Returns True if the move was cancelled."""
+
+        return self._cancelled
+
+    def cancel(self):
+        """Stop the move where it is."""
+
+        if not self._event.is_set():
+            self._cancelled = True
+            self._event.set()
+
+    def wait(self, timeout=None):
+        """Wait for the move to finish.
+
+        Returns True if the move has finished, or False if the timeout expired.
+        Raises IOError if the move failed because of an i2c error.
+
+        :param timeout: Maximum time to wait in seconds, or None to wait forever
+
+        """
+
+        finished = self._event.wait(timeout)
+
+        if self._error is not None:
+            raise self._error
+
+        return finished
+
+
+class MotionController:
+    """Smooth pan/tilt motion
+
+    Plans moves with a motion Profile and runs them from a single
+    background thread, which updates both servos at a fixed rate
+    using PanTilt.pan_tilt.
+
+    Servos only pick up a new position once per 20ms PWM frame,
+    so the default rate of 50Hz is as smooth as they can move.
+
+    """
+
+    def __init__(self, pantilt, rate=50):
+        """Create a motion controller.
+
+        :param pantilt: PanTilt instance to move
+        :param rate: Servo update rate in Hz
+
+        """
+
+        self._pantilt = pantilt
+        self._period = 1.0 / rate
+        self._condition = threading.Condition()
+        self._running = True
+
+        self._position = None
+        self._move = None
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def position(self):
+        """Returns the current commanded (pan, tilt) position in degrees."""
+
+        with self._condition:
+            if self._position is None:
+                self._position = (self._pantilt.get_pan(precise=True), self._pantilt.get_tilt(precise=True))
+
+            return self._position
+
+    def move_to(self, pan, tilt, max_speed=180, accel=720, shape=TRAPEZOID):
+        """Move smoothly to a new position.
+
+        Any move in progress is cancelled, and the new move starts
+        from wherever it had got to. Both axes arrive together.
+
+        Returns a MoveHandle, which can be used to wait for, or cancel, the move.
+
+        :param pan: Target angle of servo 1 in degrees from -90 to 90
+        :param tilt: Target angle of servo 2 in degrees from -90 to 90
+        :param max_speed: Maximum speed in degrees per second
+        :param accel: Maximum acceleration in degrees per second squared
+        :param shape: Either TRAPEZOID or SCURVE
+
+        """
+
+        self._pantilt._check_range(pan, -90, 90)
+        self._pantilt._check_range(tilt, -90, 90)
+
+        start_pan, start_tilt = self.position()
+
+        profiles = [Profile(start_pan, pan, max_speed, accel, shape),
+                    Profile(start_tilt, tilt, max_speed, accel, shape)]
+        duration = max(profile.duration for profile in profiles)
+
+        handle = MoveHandle(duration)
+
+        with self._condition:
+            if self._move is not None:
+                self._move[0].cancel()
+
+            self._move = (handle, profiles, timer())
+            self._condition.notify()
+
+        return handle
+
+    def stop(self):
+        """Cancel any move in progress and stop the background thread."""
+
+        with self._condition:
+            if self._move is not None:
+                self._move[0].cancel()
+                self._move = None
+
+            self._running = False
+            self._condition.notify()
+
+        self._thread.join()
+
+    def _run(self):
+        next_tick = timer()
+
+        while True:
+            with self._condition:
+                while self._running and (self._move is None or self._move[0].done()):
+                    self._move = None
+                    self._condition.wait()
+                    next_tick = timer()
+
+                if not self._running:
+                    return
+
+                handle, profiles, started = self._move
+
+            elapsed = timer() - started
+            # Stretch the shorter axis' profile in time, so both axes finish together
+            position = tuple(
+                profile.position(elapsed * profile.duration / handle.duration) if handle.duration > 0 else profile.end
+                for profile in profiles)
+
+            try:
+                self._pantilt.pan_tilt(*position)
+            except IOError as e:
+                handle._finish(e)
+                continue
+
+            with self._condition:
+                self._position = position
+
+            if elapsed >= handle.duration:
+                handle._finish()
+                continue
+
+            next_tick += self._period
+            delay = next_tick - timer()
+            if delay > 0:
+                with self._condition:
+                    # Wake early if a new move arrives
+                    self._condition.wait(delay)
+            else:
+                next_tick = timer()
+
+
+class PlaybackStats:
+    """Statistics for a trajectory played by play_trajectory
+
+    * sent - waypoints sent to the servos
+    * merged - late waypoints skipped because a newer waypoint was also due
+    * dropped - late waypoints skipped because they missed their deadline
+    * jitter_mean / jitter_max - how late sent waypoints were, in seconds
+
+    """
+
+    def __init__(self):
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+        self.jitter_mean = 0.0
+        self.jitter_max = 0.0
+
+    def _record(self, jitter):
+        self.sent += 1
+        self.jitter_mean += (jitter - self.jitter_mean) / self.sent
+        self.jitter_max = max(self.jitter_max, jitter)
+
+    def as_dict(self):
+        """Returns the statistics as a dictionary."""
+
+        return {
+            'sent': self.sent,
+            'merged': self.merged,
+            'dropped': self.dropped,
+            'jitter_mean': self.jitter_mean,
+            'jitter_max': self.jitter_max}
+
+
+def _sleep(delay, stop):
+    """Sleep for delay seconds, waking early if stop is set. Returns True if it was."""
+
+    if stop is None:
+        time.sleep(delay)
+        return False
+
+    return stop.wait(delay)
+
+
+def _play_samples(count, rate, send, stop, stats):
+    """Call send(index) for each of count samples at a fixed rate.
+
+    If playback falls behind, skips ahead to the sample that is due,
+    counting the skipped samples as merged. The final sample is always
+    sent. Returns False if stop was set before the end.
+
+    """
+
+    period = 1.0 / rate
+    start = timer()
+    index = 0
+
+    while index < count:
+        if stop is not None and stop.is_set():
+            return False
+
+        deadline = start + index * period
+        delay = deadline - timer()
+        if delay > 0 and _sleep(delay, stop):
+            return False
+
+        now = timer()
+        due = min(int((now - start) * rate), count - 1)
+        if due > index:
+            stats.merged += due - index
+            index = due
+            deadline = start + index * period
+
+        send(index)
+        stats._record(max(0.0, now - deadline))
+        index += 1
+
+    return True
+
+
+def play_trajectory(pantilt, waypoints, late=MERGE, tolerance=0.005, stop=None, stats=None):
+    """Play a sequence of timed waypoints.
+
+    Waypoints are (time, pan, tilt) tuples, where time is in seconds
+    from the start of playback. They are read from the iterable one at
+    a time, so a generator can supply trajectories of any length.
+
+    Each waypoint is sent when its time arrives. If playback falls more
+    than tolerance seconds behind, late waypoints are skipped rather
+    than letting the delay build up:
+
+    * MERGE - skip a late waypoint only if the next one is also due, so the newest position is always sent
+    * DROP - skip every late waypoint
+
+    The final waypoint is always sent.
+
+    Returns a PlaybackStats with jitter and skipped waypoint counts.
+
+    :param pantilt: PanTilt instance to move
+    :param waypoints: Iterable of (time, pan, tilt) tuples in time order
+    :param late: Either MERGE or DROP
+    :param tolerance: How late, in seconds, a waypoint can be before it is skipped
+    :param stop: Optional threading.Event which stops playback when set
+    :param stats: Optional PlaybackStats to update, so progress can be watched from another thread
+
+    """
+
+    if late not in [MERGE, DROP]:
+        raise ValueError("late must be MERGE or DROP")
+
+    if stats is None:
+        stats = PlaybackStats()
+
+    waypoints = iter(waypoints)
+    waypoint = next(waypoints, None)
+    start = timer()
+
+    while waypoint is not None:
+        if stop is not None and stop.is_set():
+            break
+
+        due, pan, tilt = waypoint
+        deadline = start + due
+
+        delay = deadline - timer()
+        if delay > 0 and _sleep(delay, stop):
+            break
+
+        upcoming = next(waypoints, None)
+        lateness = max(0.0, timer() - deadline)
+
+        if lateness > tolerance and upcoming is not None:
+            if late == DROP:
+                stats.dropped += 1
+                waypoint = upcoming
+                continue
+
+            if timer() >= start + upcoming[0]:
+                stats.merged += 1
+                waypoint = upcoming
+                continue
+
+        pantilt.pan_tilt(pan, tilt)
+        stats._record(lateness)
+        waypoint = upcoming
+
+    return stats
@@ -1,8 +1,17 @@
-from threading import Timer
+from collections import deque
+from timeit import default_timer as timer
+import math
 import time
 import atexit
+import threading
 from sys import version_info
 
+from .retry import RetryPolicy
+from .scheduler import shared_scheduler
+from .metrics import BusStats, describe
+from .transport import Transport, SMBusTransport, SMBus2Transport
+from .writer import BusWriter, _length
+
 
 PWM = 0
 WS2812 = 1
@@ -12,6 +21,14 @@ GRB = 1
 RGBW = 2
 GRBW = 3
 
+# Offset of the red, green, blue and white channels within a pixel, for each light type
+CHANNEL_OFFSETS = {
+    RGB: (0, 1, 2),
+    GRB: (1, 0, 2),
+    RGBW: (0, 1, 2, 3),
+    GRBW: (1, 0, 2, 3)
+}
+
 class PanTilt:
     """PanTilt HAT Driver
 
@@ -26,6 +43,8 @@ class PanTilt:
     REG_UPDATE = 0x4E
     UPDATE_WAIT = 0.03
     NUM_LEDS = 24
+    BLOCK_SIZE = 32
+    SERVO_SPEED = 0.1 / 60.0  # Seconds per degree, typical of hobby servos
 
     def __init__(self,
                  enable_lights=True,
@@ -37,7 +56,11 @@ class PanTilt:
                  servo2_min=575,
                  servo2_max=2325,
                  address=0x15,
-                 i2c_bus=None):
+                 i2c_bus=None,
+                 background_writes=False,
+                 retry_policy=None,
+                 instrumentation=False,
+                 frame_interval=None):
 
         self._is_setup = False
 
@@ -45,8 +68,8 @@ class PanTilt:
         self._servo1_timeout = None
         self._servo2_timeout = None
 
-        self._i2c_retries = 10
-        self._i2c_retry_time = 0.01
+        self._retry_policy = None
+        self.retry_policy(retry_policy if retry_policy is not None else RetryPolicy(retries=10, delay=0.01))
 
         self._enable_servo1 = False
         self._enable_servo2 = False
@@ -56,12 +79,64 @@ class PanTilt:
         self._servo_min = [servo1_min, servo2_min]
         self._servo_max = [servo1_max, servo2_max]
 
+        # Precomputed angle to pulse mapping, see _servo_update_map
+        self._servo_calibration = [None, None]
+        self._servo_centre = [0, 0]
+        self._servo_scale = [0, 0]
+        self._servo_update_map(0)
+        self._servo_update_map(1)
+
+        # Estimated physical motion of each servo, see estimated_position
+        self._servo_speed = [self.SERVO_SPEED, self.SERVO_SPEED]
+        self._servo_motion = [None, None]
+
+        # LED registers, followed by a trailing 1 which is always sent with the final block
+        self._pixels = bytearray(self.NUM_LEDS * 3 + 1)
+        self._pixels[-1] = 1
+        self._dirty = set()
+        # (start, length) of LED writes that failed in the background, for show() to mark dirty again
+        self._failed_leds = deque()
+
+        # Colour correction applied by show(), see gamma and pixel_brightness
+        self._gamma = [1.0] * 4
+        self._pixel_brightness = [1.0] * 4
+        self._luts = None
+        self._output = None
+
+        # Receives a copy of every frame sent by show(), see recording.Recorder
+        self._recorder = None
+
         self._light_mode = light_mode
-        self._light_type = light_type
+        self._light_type = None
+        self.light_type(light_type)
+        self._bytes_saved = 0
+
+        # Shadow copy of the registers we own: REG_CONFIG, REG_SERVO1 and REG_SERVO2
+        self._shadow = {}
+        self._cache_hits = 0
+        self._cache_misses = 0
 
         self._i2c_address = address
+        # Either a Transport, or an SMBus compatible object which will be wrapped in one
         self._i2c = i2c_bus
 
+        self._background_writes = background_writes
+        self._writer = None
+
+        self._stats = None
+        self.instrumentation(instrumentation)
+
+        # Servo writes waiting for the next PWM frame, see frame_coalescing
+        self._frame_interval = None
+        self._frame_lock = threading.Lock()
+        self._frame_pending = {}
+        self._frame_sent = {}
+        self._frame_timeout = None
+        self._frame_commands = 0
+        self._frame_coalesced = 0
+        self._frame_writes = 0
+        self.frame_coalescing(frame_interval)
+
     def setup(self):
         if self._is_setup:
             return True
@@ -69,12 +144,21 @@ class PanTilt:
         if self._i2c is None:
             try:
                 from smbus import SMBus
-                self._i2c = SMBus(1)
+                self._i2c = SMBusTransport(SMBus(1))
             except ImportError:
-                if version_info[0] < 3:
-                    raise ImportError("This library requires python-smbus\nInstall with: sudo apt-get install python-smbus")
-                elif version_info[0] == 3:
-                    raise ImportError("This library requires python3-smbus\nInstall with: sudo apt-get install python3-smbus")
+                try:
+                    self._i2c = SMBus2Transport(1)
+                except ImportError:
+                    if version_info[0] < 3:
+                        raise ImportError("This library requires python-smbus\nInstall with: sudo apt-get install python-smbus")
+                    elif version_info[0] == 3:
+                        raise ImportError("This library requires python3-smbus\nInstall with: sudo apt-get install python3-smbus")
+
+        elif not isinstance(self._i2c, Transport):
+            self._i2c = SMBusTransport(self._i2c)
+
+        if self._background_writes:
+            self.background_writes(True)
 
         self.clear()
         self._set_config()
@@ -89,11 +173,17 @@ class PanTilt:
         if self._servo2_timeout is not None:
             self._servo2_timeout.cancel()
 
+        if self._frame_timeout is not None:
+            self._frame_timeout.cancel()
+
         self._enable_servo1 = False
         self._enable_servo2 = False
 
         self._set_config()
 
+        if self._writer is not None:
+            self.background_writes(False)
+
     def idle_timeout(self, value):
         """Set the idle timeout for the servos
 
@@ -115,7 +205,71 @@ class PanTilt:
         config |= self._light_mode    << 3
         config |= self._light_on      << 4
 
-        self._i2c_write_byte(self.REG_CONFIG, config)
+        self._shadow_write_byte(self.REG_CONFIG, config)
+
+    def _shadow_write_byte(self, reg, data):
+        """Write a byte register, skipping the write if it already holds data."""
+
+        if self._shadow.get(reg) == data:
+            self._cache_hits += 1
+            return
+
+        self._cache_misses += 1
+        self._i2c_write_byte(reg, data)
+        self._shadow[reg] = data
+
+    def _shadow_write_word(self, reg, data):
+        """Write a word register, skipping the write if it already holds data."""
+
+        if self._shadow.get(reg) == data:
+            self._cache_hits += 1
+            return
+
+        self._cache_misses += 1
+        self._i2c_write_word(reg, data)
+        self._shadow[reg] = data
+
+    def _shadow_read_word(self, reg):
+        """Read a word register, from the shadow copy if it is known."""
+
+        data = self._shadow.get(reg)
+        if data is not None:
+            self._cache_hits += 1
+            return data
+
+        self._cache_misses += 1
+        data = self._i2c_read_word(reg)
+        self._shadow[reg] = data
+        return data
+
+    def refresh(self):
+        """Re-read the config and servo registers from PanTilt HAT.
+
+        The library keeps a copy of the registers it writes, so it can
+        skip redundant writes and answer get_pan/get_tilt without a read.
+        Call this if the HAT may have been reset or changed by another program.
+
+        """
+
+        self.setup()
+
+        config = self._i2c_read_byte(self.REG_CONFIG)
+        self._shadow[self.REG_CONFIG] = config
+        self._shadow[self.REG_SERVO1] = self._i2c_read_word(self.REG_SERVO1)
+        self._shadow[self.REG_SERVO2] = self._i2c_read_word(self.REG_SERVO2)
+
+        self._enable_servo1 = bool(config & 0b01)
+        self._enable_servo2 = bool(config & 0b10)
+
+    def cache_info(self):
+        """Returns register cache statistics.
+
+        A hit is a register write or read that was answered without using the i2c bus,
+        a miss is one that had to use it.
+
+        """
+
+        return {'hits': self._cache_hits, 'misses': self._cache_misses}
 
     def _check_int_range(self, value, value_min, value_max):
         """Check the type and bounds check an expected int value."""
@@ -137,102 +291,289 @@ class PanTilt:
                 min=value_min,
                 max=value_max))
 
-    def _servo_us_to_degrees(self, us, us_min, us_max):
-        """Converts pulse time in microseconds to degrees
+    def _servo_range(self, servo_index):
+        """Get the min and max range values for a servo"""
 
-        :param us: Pulse time in microseconds
-        :param us_min: Minimum possible pulse time in microseconds
-        :param us_max: Maximum possible pulse time in microseconds
+        return (self._servo_min[servo_index], self._servo_max[servo_index])
 
-        """
+    def _servo_update_map(self, servo_index):
+        """Precompute the angle to pulse mapping for a servo, after its range changes."""
 
-        self._check_range(us, us_min, us_max)
-        servo_range = us_max - us_min
-        angle = (float(us - us_min) / float(servo_range)) * 180.0
-        return int(round(angle, 0)) - 90
+        us_min, us_max = self._servo_range(servo_index)
+        self._servo_centre[servo_index] = (us_min + us_max) / 2.0
+        self._servo_scale[servo_index] = (us_max - us_min) / 180.0
 
-    def _servo_degrees_to_us(self, angle, us_min, us_max):
+    def _servo_to_us(self, servo_index, angle):
         """Converts degrees into a servo pulse time in microseconds
 
-        :param angle: Angle in degrees from -90 to 90
+        :param servo_index: Servo index: either 0 or 1
+        :param angle: Angle in degrees from -90 to 90, may be fractional
 
         """
 
         self._check_range(angle, -90, 90)
 
-        angle += 90
-        servo_range = us_max - us_min
-        us = (servo_range / 180.0) * angle
-        return us_min + int(us)
+        calibration = self._servo_calibration[servo_index]
+        if calibration is not None:
+            return int(round(calibration.to_us(angle)))
 
-    def _servo_range(self, servo_index):
-        """Get the min and max range values for a servo"""
+        return int(round(self._servo_centre[servo_index] + angle * self._servo_scale[servo_index]))
 
-        return (self._servo_min[servo_index], self._servo_max[servo_index])
+    def _servo_to_degrees(self, servo_index, us):
+        """Converts a servo pulse time in microseconds into degrees
+
+        :param servo_index: Servo index: either 0 or 1
+        :param us: Pulse time in microseconds
+
+        """
+
+        self._check_range(us, self._servo_min[servo_index], self._servo_max[servo_index])
+
+        calibration = self._servo_calibration[servo_index]
+        if calibration is not None:
+            return calibration.to_degrees(us)
+
+        return (us - self._servo_centre[servo_index]) / self._servo_scale[servo_index]
+
+    def _i2c_retry(self, method, args, message):
+        """Call an SMBus method, retrying on IOError according to the retry policy."""
+
+        stats = self._stats
+        if stats is not None:
+            start = timer()
+
+        policy = self._retry_policy
+        attempt = 0
+
+        try:
+            policy.allow()
+
+            for attempt, delay in enumerate(policy.delays()):
+                if delay > 0:
+                    time.sleep(delay)
 
-    def _i2c_write_block(self, reg, data):
-        if type(data) is list:
-            for x in range(self._i2c_retries):
                 try:
-                    self._i2c.write_i2c_block_data(self._i2c_address, reg, data)
-                    return
+                    result = getattr(self._i2c, method)(self._i2c_address, *args)
                 except IOError:
-                    time.sleep(self._i2c_retry_time)
                     continue
 
-            raise IOError("Failed to write block")
+                policy.success()
+                if stats is not None:
+                    reg, length = describe(method, args)
+                    stats.record(method, reg, length, attempt, False, timer() - start)
+                return result
+
+            policy.failure()
+            raise IOError(message)
+
+        except IOError:
+            if stats is not None:
+                reg, length = describe(method, args)
+                stats.record(method, reg, length, attempt, True, timer() - start)
+            raise
+
+    def instrumentation(self, state):
+        """Enable or disable i2c bus statistics.
+
+        When enabled, the number of calls, bytes, retries, failures and a latency
+        histogram are recorded for every i2c operation and register. See stats().
+
+        :param state: True = record statistics, False = don't
+
+        """
+
+        if state not in [True, False]:
+            raise ValueError("State must be True/False")
+
+        if state and self._stats is None:
+            self._stats = BusStats()
+
+        elif not state:
+            self._stats = None
+
+    def stats(self):
+        """Returns a snapshot of the library's statistics.
+
+        A dictionary, containing only plain values so it can be serialised with json:
+
+        * bus - per "operation:register" i2c statistics, if instrumentation is enabled
+        * cache - register cache hits and misses, see cache_info()
+        * writer - background write counts, see writer_info()
+        * bytes_saved - LED bytes not sent by show(), see bytes_saved()
+
+        pantilthat.metrics.flatten() turns this into metric names and values.
+
+        """
+
+        return {
+            'bus': self._stats.snapshot() if self._stats is not None else {},
+            'cache': self.cache_info(),
+            'writer': self.writer_info(),
+            'bytes_saved': self.bytes_saved()}
+
+    def reset_stats(self):
+        """Reset all statistics to zero."""
+
+        if self._stats is not None:
+            self._stats.reset()
+
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._bytes_saved = 0
+
+        if self._writer is not None:
+            self._writer.reset()
+
+    def _i2c_probe(self):
+        """Check PanTilt HAT is responding, raises IOError if not."""
+
+        self._i2c.read_byte_data(self._i2c_address, self.REG_CONFIG)
+
+    def retry_policy(self, policy):
+        """Set the policy used to retry failed i2c transfers.
+
+        The default policy tries 10 times, 10ms apart. See the
+        pantilthat.retry module for exponential backoff and a circuit breaker.
+
+        :param policy: A RetryPolicy instance
+
+        """
+
+        policy.bind(self._i2c_probe)
+        self._retry_policy = policy
+
+    def _i2c_write(self, reg, method, data, message):
+        """Write a register now, or queue it if background writes are enabled."""
+
+        if self._writer is not None:
+            self._writer.put(reg, method, data, message)
+            return
+
+        self._i2c_write_now(reg, method, data, message)
+
+    def _i2c_write_now(self, reg, method, data, message):
+        self._i2c_retry(method, (reg, data), message)
+
+    def _i2c_write_failed(self, reg, method, data):
+        """Called by the background writer when a queued write could not be sent."""
+
+        # The register state is unknown, make sure it's sent again next time.
+        # Each pop is atomic, so this is safe from the writer thread.
+        for shadowed in range(reg, reg + _length(method, data)):
+            self._shadow.pop(shadowed, None)
+
+        # show() reads and clears _dirty on the caller's thread, so leave it to mark these
+        if reg >= self.REG_WS2812 and method == 'write_i2c_block_data':
+            self._failed_leds.append((reg - self.REG_WS2812, len(data)))
+
+    def _i2c_write_block(self, reg, data):
+        if isinstance(data, (list, bytes, bytearray, memoryview)):
+            self._i2c_write(reg, 'write_i2c_block_data', data, "Failed to write block")
         else:
-            raise ValueError("Value must be a list")
+            raise ValueError("Value must be a list or buffer")
+
+    def _i2c_write_many(self, writes):
+        """Write several register blocks, in one transaction if the transport supports it."""
+
+        if self._writer is not None:
+            # Copied, because the caller's buffer may change before the writer sends it
+            for reg, data in writes:
+                self._writer.put(reg, 'write_i2c_block_data', bytearray(data), "Failed to write block")
+            return
+
+        self._i2c_write_many_now(writes)
+
+    def _i2c_write_many_now(self, writes):
+        self._i2c_retry('write_many', (writes,), "Failed to write block")
 
     def _i2c_write_word(self, reg, data):
         if type(data) is int:
-            for x in range(self._i2c_retries):
-                try:
-                    self._i2c.write_word_data(self._i2c_address, reg, data)
-                    return
-                except IOError:
-                    time.sleep(self._i2c_retry_time)
-                    continue
-
-            raise IOError("Failed to write word")
+            self._i2c_write(reg, 'write_word_data', data, "Failed to write word")
 
     def _i2c_write_byte(self, reg, data):
         if type(data) is int:
-            for x in range(self._i2c_retries):
-                try:
-                    self._i2c.write_byte_data(self._i2c_address, reg, data)
-                    return
-                except IOError:
-                    time.sleep(self._i2c_retry_time)
-                    continue
-
-            raise IOError("Failed to write byte")
+            self._i2c_write(reg, 'write_byte_data', data, "Failed to write byte")
 
     def _i2c_read_byte(self, reg):
-        for x in range(self._i2c_retries):
-            try:
-                return self._i2c.read_byte_data(self._i2c_address, reg)
-            except IOError:
-                time.sleep(self._i2c_retry_time)
-                continue
+        if self._writer is not None:
+            self._writer.flush()
 
-        raise IOError("Failed to read byte")
+        return self._i2c_retry('read_byte_data', (reg,), "Failed to read byte")
 
     def _i2c_read_word(self, reg):
-        for x in range(self._i2c_retries):
-            try:
-                return self._i2c.read_word_data(self._i2c_address, reg)
-            except IOError:
-                time.sleep(self._i2c_retry_time)
-                continue
+        if self._writer is not None:
+            self._writer.flush()
+
+        return self._i2c_retry('read_word_data', (reg,), "Failed to read byte")
+
+    def background_writes(self, state):
+        """Enable or disable background i2c writes.
 
-        raise IOError("Failed to read byte")
+        When enabled, methods such as pan, tilt and show return immediately
+        and a single background thread sends the changes to PanTilt HAT.
+        If a register is changed again before it has been sent, only
+        the newest value is sent.
+
+        :param state: True = send writes in the background, False = send writes immediately
+
+        """
+
+        if state not in [True, False]:
+            raise ValueError("State must be True/False")
+
+        if state and self._writer is None:
+            self._writer = BusWriter(self._i2c_write_now, self._i2c_write_failed)
+
+        elif not state and self._writer is not None:
+            writer, self._writer = self._writer, None
+            writer.stop()
+
+    def flush(self, timeout=None):
+        """Wait until all background writes have been sent to PanTilt HAT.
+
+        Servo writes held back by frame_coalescing are sent straight away.
+
+        Raises IOError if any background write failed.
+
+        :param timeout: Maximum time to wait in seconds, or None to wait forever
+
+        """
+
+        self._frame_send(force=True)
+
+        if self._writer is not None:
+            self._writer.flush(timeout)
+
+    def writer_info(self):
+        """Returns background write statistics.
+
+        The number of writes queued, merged into a newer write of
+        the same register, and actually sent to PanTilt HAT.
+
+        """
+
+        if self._writer is None:
+            return {'queued': 0, 'merged': 0, 'written': 0}
+
+        return self._writer.info()
 
     def clear(self):
         """Clear the buffer."""
 
-        self._pixels = [0] * self.NUM_LEDS * 3
-        self._pixels += [1]
+        self._pixels[:-1] = bytearray(len(self._pixels) - 1)
+        self._mark_dirty(0, len(self._pixels))
+
+    def _mark_dirty(self, start, length):
+        """Flag the register blocks covering a range of the pixel buffer as changed."""
+
+        first = start // self.BLOCK_SIZE
+        last = (start + length - 1) // self.BLOCK_SIZE
+        self._dirty.update(range(first, last + 1))
+
+    def bytes_saved(self):
+        """Returns the number of LED bytes show() has skipped because they were unchanged."""
+
+        return self._bytes_saved
 
     def light_mode(self, mode):
         """Set the light mode for attached lights.
@@ -262,7 +603,81 @@ class PanTilt:
 
         """
 
+        if set_type not in CHANNEL_OFFSETS:
+            raise ValueError("Light type must be RGB, GRB, RGBW or GRBW")
+
         self._light_type = set_type
+        self._channel_offsets = CHANNEL_OFFSETS[set_type]
+        self._pixel_stride = 4 if set_type in [RGBW, GRBW] else 3
+        self._update_luts()
+
+    def _per_channel(self, value):
+        """Expand a single value, or (red, green, blue[, white]) values, into a value per channel."""
+
+        if isinstance(value, (tuple, list)):
+            if len(value) not in (3, 4):
+                raise ValueError("Give one value, or a value for each of red, green, blue and optionally white")
+            return [float(v) for v in value] + [1.0] * (4 - len(value))
+
+        return [float(value)] * 4
+
+    def _update_luts(self):
+        """Rebuild the per-channel lookup tables show() uses for gamma and brightness."""
+
+        tables = []
+        for gamma, brightness in zip(self._gamma, self._pixel_brightness):
+            if gamma == 1.0 and brightness == 1.0:
+                tables.append(None)
+            else:
+                tables.append(bytes(bytearray(
+                    int(round(255 * brightness * (value / 255.0) ** gamma)) for value in range(256))))
+
+        if not any(tables[:self._pixel_stride]):
+            self._luts = None
+            return
+
+        identity = bytes(bytearray(range(256)))
+        # Pair each table with the offset of its channel within a pixel
+        self._luts = [(offset, table or identity) for offset, table in zip(self._channel_offsets, tables)]
+
+    def gamma(self, value):
+        """Set the gamma correction applied to pixels by show().
+
+        LEDs look much brighter at low values than their numbers suggest,
+        a gamma of around 2.2 makes fades look even. The buffer is not
+        changed, the correction is applied as it is sent.
+
+        :param value: Gamma, 1.0 for none, or a (red, green, blue[, white]) tuple of gammas
+
+        """
+
+        values = self._per_channel(value)
+        for gamma in values:
+            if gamma <= 0:
+                raise ValueError("Gamma should be greater than 0")
+
+        self._gamma = values
+        self._update_luts()
+        self._mark_dirty(0, len(self._pixels))
+
+    def pixel_brightness(self, value):
+        """Set the brightness of WS2812 and SK6812 pixels.
+
+        Scales every pixel as show() sends it, after gamma correction,
+        so the buffer keeps its full resolution. For PWM lights, use brightness.
+
+        :param value: Brightness from 0.0 to 1.0, or a (red, green, blue[, white]) tuple of brightnesses
+
+        """
+
+        values = self._per_channel(value)
+        for brightness in values:
+            if brightness < 0 or brightness > 1:
+                raise ValueError("Brightness should be between 0.0 and 1.0")
+
+        self._pixel_brightness = values
+        self._update_luts()
+        self._mark_dirty(0, len(self._pixels))
 
     def num_pixels(self):
         """Returns the supported number of pixels depending on light mode.
@@ -272,10 +687,7 @@ class PanTilt:
 
         """
 
-        if self._light_type in [RGBW, GRBW]:
-            return 18
-
-        return 24
+        return (self.NUM_LEDS * 3) // self._pixel_stride
 
     def brightness(self, brightness):
         """Set the brightness of the connected LED ring.
@@ -295,6 +707,8 @@ class PanTilt:
         if self._light_mode == PWM:
             # The brightness value is taken from the first register of the WS2812 chain
             self._i2c_write_byte(self.REG_WS2812, brightness)
+            # ...which overwrites the first pixel, so it must be resent by show()
+            self._mark_dirty(0, 1)
 
     def set_all(self, red, green, blue, white=None):
         """Set all pixels in the buffer.
@@ -306,8 +720,93 @@ class PanTilt:
 
         """
 
-        for index in range(self.num_pixels()):
-            self.set_pixel(index, red, green, blue, white)
+        for color in [red, green, blue]:
+            self._check_int_range(color, 0, 255)
+
+        if white is not None:
+            self._check_int_range(white, 0, 255)
+
+        stride = self._pixel_stride
+        count = self.num_pixels()
+        end = count * stride
+
+        # Fill each channel of every pixel with one extended slice assignment
+        for offset, value in zip(self._channel_offsets, (red, green, blue, white)):
+            if value is not None:
+                self._pixels[offset:end:stride] = bytearray([value]) * count
+
+        self._mark_dirty(0, end)
+
+    def set_pixels(self, frame):
+        """Set every pixel in the buffer from a whole frame.
+
+        The frame has a row for each pixel, with red, green and blue,
+        and optionally white, from 0 to 255. It may be a NumPy array,
+        a list of rows, or a buffer such as bytes in RGB or RGBW order.
+
+        Channels are reordered to suit the light type in one step, so
+        effects can be rendered as arrays and sent with a single call.
+
+        :param frame: Frame of shape (num_pixels(), 3) or (num_pixels(), 4)
+
+        """
+
+        try:
+            import numpy
+        except ImportError:
+            self._set_pixels_list(frame)
+            return
+
+        count = self.num_pixels()
+        stride = self._pixel_stride
+
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            frame = numpy.frombuffer(frame, dtype=numpy.uint8)
+        else:
+            frame = numpy.asarray(frame)
+
+        if frame.ndim == 1 and frame.size in (count * 3, count * 4):
+            frame = frame.reshape(count, -1)
+
+        if frame.ndim != 2 or frame.shape[0] != count or frame.shape[1] not in (3, 4):
+            raise ValueError("Frame should have shape ({count}, 3) or ({count}, 4)".format(count=count))
+
+        if frame.dtype.kind not in 'ui':
+            raise TypeError("Frame values should be integers")
+
+        if frame.dtype != numpy.uint8:
+            if frame.size and (frame.min() < 0 or frame.max() > 255):
+                raise ValueError("Frame values should be between 0 and 255")
+            frame = frame.astype(numpy.uint8)
+
+        offsets = list(self._channel_offsets[:frame.shape[1]])
+        pixels = numpy.frombuffer(self._pixels, dtype=numpy.uint8, count=count * stride).reshape(count, stride)
+        pixels[:, offsets] = frame[:, :len(offsets)]
+
+        self._mark_dirty(0, count * stride)
+
+    def _set_pixels_list(self, frame):
+        """Set every pixel in the buffer from a frame, without NumPy."""
+
+        count = self.num_pixels()
+        stride = self._pixel_stride
+
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            data = bytearray(frame)
+        else:
+            if len(frame) != count:
+                raise ValueError("Frame should have a row for each of the {count} pixels".format(count=count))
+            data = bytearray(value for row in frame for value in row)
+
+        channels = len(data) // count
+        if channels not in (3, 4) or len(data) != count * channels:
+            raise ValueError("Frame should have shape ({count}, 3) or ({count}, 4)".format(count=count))
+
+        end = count * stride
+        for channel, offset in enumerate(self._channel_offsets[:channels]):
+            self._pixels[offset:end:stride] = data[channel::channels]
+
+        self._mark_dirty(0, end)
 
     def set_pixel_rgbw(self, index, red, green, blue, white):
         """Set a single pixel in the buffer for GRBW lighting stick
@@ -341,42 +840,103 @@ class PanTilt:
         if white is not None:
             self._check_int_range(white, 0, 255)
 
-        if self._light_type in [RGBW, GRBW]:
-            index *= 4
-            if self._light_type == RGBW:
-                self._pixels[index] = red
-                self._pixels[index+1] = green
-                self._pixels[index+2] = blue
+        stride = self._pixel_stride
+        offsets = self._channel_offsets
+        index *= stride
+
+        self._pixels[index + offsets[0]] = red
+        self._pixels[index + offsets[1]] = green
+        self._pixels[index + offsets[2]] = blue
+
+        if white is not None and stride == 4:
+            self._pixels[index + offsets[3]] = white
+
+        self._mark_dirty(index, stride)
+
+    def show(self):
+        """Display the buffer on the connected WS2812 strip.
+
+        Only the 32 byte register blocks that have changed since
+        the last call are sent. If nothing has changed, nothing is sent.
+
+        """
+
+        self.setup()
+
+        while self._failed_leds:
+            self._mark_dirty(*self._failed_leds.popleft())
+
+        pixels = self._pixels
+
+        if self._luts is not None:
+            # Setting up the tables marked every block dirty, so the output is always current
+            if self._dirty:
+                if self._output is None:
+                    self._output = bytearray(pixels)
+
+                stride = self._pixel_stride
+                end = self.num_pixels() * stride
+                tables = set(table for offset, table in self._luts)
+
+                if len(tables) == 1:
+                    self._output[:end] = pixels[:end].translate(tables.pop())
+                else:
+                    for offset, table in self._luts:
+                        self._output[offset:end:stride] = pixels[offset:end:stride].translate(table)
+
+                self._output[end:] = pixels[end:]
+
+            pixels = self._output
+
+        if self._recorder is not None:
+            self._recorder._frame(pixels)
 
-            if self._light_type == GRBW:
-                self._pixels[index] = green
-                self._pixels[index+1] = red
-                self._pixels[index+2] = blue
+        # Blocks are sent as views of the buffer, rather than copies
+        pixels = memoryview(pixels)
 
-            if white is not None:
-                self._pixels[index+3] = white
+        writes = []
+        for block in range((len(self._pixels) + self.BLOCK_SIZE - 1) // self.BLOCK_SIZE):
+            start = block * self.BLOCK_SIZE
+            data = pixels[start:start + self.BLOCK_SIZE]
+            if block in self._dirty:
+                writes.append((self.REG_WS2812 + start, data))
+            else:
+                self._bytes_saved += len(data)
 
+        if writes:
+            writes.append((self.REG_UPDATE, [1]))
+            self._i2c_write_many(writes)
         else:
-            index *= 3
-            if self._light_type == RGB:
-                self._pixels[index] = red
-                self._pixels[index+1] = green
-                self._pixels[index+2] = blue
+            self._bytes_saved += 1
 
-            if self._light_type == GRB:
-                self._pixels[index] = green
-                self._pixels[index+1] = red
-                self._pixels[index+2] = blue
+        self._dirty.clear()
 
-    def show(self):
-        """Display the buffer on the connected WS2812 strip."""
+    def show_raw(self, data):
+        """Send LED register data straight to the connected WS2812 strip.
+
+        The data is sent as it is, bypassing the pixel buffer, channel
+        order and colour correction, as recorded by recording.Recorder.
+        The next show() resends the whole buffer.
+
+        :param data: Buffer of up to 73 bytes, laid out like the LED registers
+
+        """
 
         self.setup()
 
-        self._i2c_write_block(self.REG_WS2812, self._pixels[:32])
-        self._i2c_write_block(self.REG_WS2812 + 32, self._pixels[32:64])
-        self._i2c_write_block(self.REG_WS2812 + 64, self._pixels[64:])
-        self._i2c_write_byte(self.REG_UPDATE, 1)
+        if len(data) > len(self._pixels):
+            raise ValueError("Data should be at most {length} bytes".format(length=len(self._pixels)))
+
+        data = memoryview(data)
+
+        writes = []
+        for start in range(0, len(data), self.BLOCK_SIZE):
+            writes.append((self.REG_WS2812 + start, data[start:start + self.BLOCK_SIZE]))
+
+        writes.append((self.REG_UPDATE, [1]))
+        self._i2c_write_many(writes)
+
+        self._mark_dirty(0, len(self._pixels))
 
     def servo_enable(self, index, state):
         """Enable or disable a servo.
@@ -418,6 +978,7 @@ class PanTilt:
             raise ValueError("Servo index must be 1 or 2")
 
         self._servo_min[index-1] = value
+        self._servo_update_map(index-1)
 
     def servo_pulse_max(self, index, value):
         """Set the maximum high pulse for a servo in microseconds.
@@ -430,93 +991,444 @@ class PanTilt:
             raise ValueError("Servo index must be 1 or 2")
 
         self._servo_max[index-1] = value
+        self._servo_update_map(index-1)
+
+    def servo_speed(self, index, seconds, degrees=60):
+        """Set how fast a servo moves, for estimated_position and wait_until_settled.
+
+        Servo datasheets usually give the time to move 60 degrees,
+        for example 0.1 seconds, the default.
+
+        :param index: Servo index: either 1 or 2
+        :param seconds: Time in seconds the servo takes to move the given number of degrees
+        :param degrees: Distance in degrees
+
+        """
+
+        if index not in [1, 2]:
+            raise ValueError("Servo index must be 1 or 2")
+
+        if seconds <= 0 or degrees <= 0:
+            raise ValueError("seconds and degrees should be greater than 0")
+
+        self._servo_speed[index-1] = float(seconds) / degrees
+
+    def _servo_track(self, index, us):
+        """Start modelling a servo's travel towards a newly written pulse time."""
+
+        now = timer()
+
+        try:
+            target = self._servo_to_degrees(index, us)
+        except ValueError:
+            self._servo_motion[index] = None
+            return
+
+        start = self._servo_estimate(index, now)
+        if start is None:
+            # Nobody knows where the servo is, assume it has the furthest to go
+            start = -90.0 if target >= 0 else 90.0
+
+        self._servo_motion[index] = (start, target, now)
+
+    def _servo_estimate(self, index, now):
+        """Returns the estimated angle of a servo at a given time, or None if it is unknown."""
+
+        motion = self._servo_motion[index]
+
+        if motion is None:
+            us = self._shadow.get((self.REG_SERVO1, self.REG_SERVO2)[index])
+            if us is None:
+                return None
+            try:
+                return self._servo_to_degrees(index, us)
+            except ValueError:
+                return None
+
+        start, target, started = motion
+        travelled = (now - started) / self._servo_speed[index]
+
+        if travelled >= abs(target - start):
+            return target
+
+        return start + travelled if target > start else start - travelled
+
+    def _servo_unsettled(self):
+        """Returns the time in seconds until both servos should have stopped moving."""
 
-    def get_servo_one(self):
-        """Get position of servo 1 in degrees."""
+        now = timer()
+        remaining = 0.0
+
+        for index, motion in enumerate(self._servo_motion):
+            if motion is not None:
+                start, target, started = motion
+                remaining = max(remaining, started + abs(target - start) * self._servo_speed[index] - now)
+
+        if self._frame_pending:
+            # A held write will start a new move when its frame comes round
+            remaining = max(remaining, self._frame_interval)
+
+        return remaining
+
+    def estimated_position(self):
+        """Returns the estimated (pan, tilt) the servos have physically reached, in degrees.
+
+        get_pan and get_tilt return where the servos have been told to go,
+        this models their travel from the time of each move, using the speeds
+        set with servo_speed. An axis is None if its position is unknown.
+
+        """
+
+        now = timer()
+        return (self._servo_estimate(0, now), self._servo_estimate(1, now))
+
+    def wait_until_settled(self, timeout=None):
+        """Wait until the servos should have physically reached their positions.
+
+        Returns True once they have, or False if the timeout expired first.
+
+        :param timeout: Maximum time to wait in seconds, or None to wait as long as it takes
+
+        """
+
+        deadline = None if timeout is None else timer() + timeout
+
+        while True:
+            remaining = self._servo_unsettled()
+            if remaining <= 0:
+                return True
+
+            if deadline is not None:
+                left = deadline - timer()
+                if left <= 0:
+                    return False
+                remaining = min(remaining, left)
+
+            time.sleep(remaining)
+
+    def servo_calibration(self, index, calibration):
+        """Set a measured angle to pulse calibration for a servo.
+
+        By default, angles map linearly onto the servo_pulse_min to
+        servo_pulse_max range. A pantilthat.calibration.Calibration
+        can correct for servos that are not linear.
+
+        The servo's pulse range is set to the range of the calibration table.
+
+        :param index: Servo index: either 1 or 2
+        :param calibration: A Calibration, or None to return to the linear mapping
+
+        """
+
+        if index not in [1, 2]:
+            raise ValueError("Servo index must be 1 or 2")
+
+        self._servo_calibration[index-1] = calibration
+
+        if calibration is not None:
+            us_min, us_max = calibration.pulse_range()
+            self._servo_min[index-1] = int(math.floor(us_min))
+            self._servo_max[index-1] = int(math.ceil(us_max))
+            self._servo_update_map(index-1)
+
+    def get_servo_one(self, precise=False):
+        """Get position of servo 1 in degrees.
+
+        :param precise: True = return fractional degrees, False = round to whole degrees
+
+        """
 
         self.setup()
 
-        us_min, us_max = self._servo_range(0)
-        us = self._i2c_read_word(self.REG_SERVO1)
+        us = self._servo_read(self.REG_SERVO1)
 
         try:
-            return self._servo_us_to_degrees(us, us_min, us_max)
+            angle = self._servo_to_degrees(0, us)
         except ValueError:
             return 0
 
-    def get_servo_two(self):
-        """Get position of servo 2 in degrees."""
+        return angle if precise else int(round(angle))
+
+    def get_servo_two(self, precise=False):
+        """Get position of servo 2 in degrees.
+
+        :param precise: True = return fractional degrees, False = round to whole degrees
+
+        """
 
         self.setup()
 
-        us_min, us_max = self._servo_range(1)
-        us = self._i2c_read_word(self.REG_SERVO2)
+        us = self._servo_read(self.REG_SERVO2)
+
         try:
-            return self._servo_us_to_degrees(us, us_min, us_max)
+            angle = self._servo_to_degrees(1, us)
         except ValueError:
             return 0
 
+        return angle if precise else int(round(angle))
+
+    def get_servo_one_us(self):
+        """Get the pulse time of servo 1 in microseconds."""
+
+        self.setup()
+
+        return self._servo_read(self.REG_SERVO1)
+
+    def get_servo_two_us(self):
+        """Get the pulse time of servo 2 in microseconds."""
+
+        self.setup()
+
+        return self._servo_read(self.REG_SERVO2)
+
     def servo_one(self, angle):
         """Set position of servo 1 in degrees.
 
-        :param angle: Angle in degrees from -90 to 90
+        :param angle: Angle in degrees from -90 to 90, may be fractional
+
+        """
+
+        self.servo_one_us(self._servo_to_us(0, angle))
+
+    def servo_one_us(self, us):
+        """Set the pulse time of servo 1 in microseconds.
+
+        :param us: Pulse time, between the minimum and maximum set with servo_pulse_min/servo_pulse_max
 
         """
 
         self.setup()
 
+        self._check_range(us, self._servo_min[0], self._servo_max[0])
+
         if not self._enable_servo1:
             self._enable_servo1 = True
             self._set_config()
 
-        us_min, us_max = self._servo_range(0)
-        us = self._servo_degrees_to_us(angle, us_min, us_max)
-        self._i2c_write_word(self.REG_SERVO1, us)
+        self._servo_write({self.REG_SERVO1: int(round(us))})
 
-        if self._idle_timeout > 0:
-            if self._servo1_timeout is not None:
-                self._servo1_timeout.cancel()
+        self._servo1_idle()
 
-            self._servo1_timeout = Timer(self._idle_timeout, self._servo1_stop)
-            self._servo1_timeout.daemon = True
-            self._servo1_timeout.start()
+    def _servo1_idle(self):
+        if self._idle_timeout > 0:
+            if self._servo1_timeout is None:
+                self._servo1_timeout = shared_scheduler().schedule(self._idle_timeout, self._servo1_stop)
+            else:
+                self._servo1_timeout.rearm(self._idle_timeout)
 
     def _servo1_stop(self):
-        self._servo1_timeout = None
         self._enable_servo1 = False
         self._set_config()
 
     def servo_two(self, angle):
         """Set position of servo 2 in degrees.
 
-        :param angle: Angle in degrees from -90 to 90
+        :param angle: Angle in degrees from -90 to 90, may be fractional
+
+        """
+
+        self.servo_two_us(self._servo_to_us(1, angle))
+
+    def servo_two_us(self, us):
+        """Set the pulse time of servo 2 in microseconds.
+
+        :param us: Pulse time, between the minimum and maximum set with servo_pulse_min/servo_pulse_max
 
         """
 
         self.setup()
 
+        self._check_range(us, self._servo_min[1], self._servo_max[1])
+
         if not self._enable_servo2:
             self._enable_servo2 = True
             self._set_config()
 
-        us_min, us_max = self._servo_range(1)
-        us = self._servo_degrees_to_us(angle, us_min, us_max)
-        self._i2c_write_word(self.REG_SERVO2, us)
+        self._servo_write({self.REG_SERVO2: int(round(us))})
 
-        if self._idle_timeout > 0:
-            if self._servo2_timeout is not None:
-                self._servo2_timeout.cancel()
+        self._servo2_idle()
 
-            self._servo2_timeout = Timer(self._idle_timeout, self._servo2_stop)
-            self._servo2_timeout.daemon = True
-            self._servo2_timeout.start()
+    def _servo2_idle(self):
+        if self._idle_timeout > 0:
+            if self._servo2_timeout is None:
+                self._servo2_timeout = shared_scheduler().schedule(self._idle_timeout, self._servo2_stop)
+            else:
+                self._servo2_timeout.rearm(self._idle_timeout)
 
     def _servo2_stop(self):
-        self._servo2_timeout = None
         self._enable_servo2 = False
         self._set_config()
 
+    def pan_tilt(self, pan, tilt):
+        """Set position of both servos in degrees.
+
+        Both servos are updated together in a single i2c transaction.
+
+        :param pan: Angle of servo 1 in degrees from -90 to 90, may be fractional
+        :param tilt: Angle of servo 2 in degrees from -90 to 90, may be fractional
+
+        """
+
+        self.setup()
+
+        self.pan_tilt_us(self._servo_to_us(0, pan), self._servo_to_us(1, tilt))
+
+    def pan_tilt_us(self, us_pan, us_tilt):
+        """Set the pulse time of both servos in microseconds.
+
+        Both servos are updated together in a single i2c transaction.
+
+        :param us_pan: Pulse time of servo 1, between its minimum and maximum
+        :param us_tilt: Pulse time of servo 2, between its minimum and maximum
+
+        """
+
+        self.setup()
+
+        self._check_range(us_pan, self._servo_min[0], self._servo_max[0])
+        self._check_range(us_tilt, self._servo_min[1], self._servo_max[1])
+
+        us_pan = int(round(us_pan))
+        us_tilt = int(round(us_tilt))
+
+        if not (self._enable_servo1 and self._enable_servo2):
+            self._enable_servo1 = True
+            self._enable_servo2 = True
+            self._set_config()
+
+        self._servo_write({self.REG_SERVO1: us_pan, self.REG_SERVO2: us_tilt})
+
+        self._servo1_idle()
+        self._servo2_idle()
+
+    def _servo_write(self, values):
+        """Write servo pulse registers, or hold them for the next frame if frame_coalescing is enabled.
+
+        :param values: Dictionary of register to pulse time in microseconds
+
+        """
+
+        if self._frame_interval is None:
+            self._servo_write_now(values)
+            return
+
+        with self._frame_lock:
+            self._frame_commands += len(values)
+            self._frame_coalesced += len(set(values) & set(self._frame_pending))
+            self._frame_pending.update(values)
+
+        self._frame_send()
+
+    def _servo_write_now(self, values):
+        """Write servo pulse registers, skipping any that already hold the value."""
+
+        us_pan = values.get(self.REG_SERVO1)
+        us_tilt = values.get(self.REG_SERVO2)
+
+        for index, us in enumerate((us_pan, us_tilt)):
+            if us is not None and us != self._shadow.get((self.REG_SERVO1, self.REG_SERVO2)[index]):
+                self._servo_track(index, us)
+
+        if us_tilt is None:
+            self._shadow_write_word(self.REG_SERVO1, us_pan)
+
+        elif us_pan is None or self._shadow.get(self.REG_SERVO1) == us_pan:
+            self._shadow_write_word(self.REG_SERVO2, us_tilt)
+
+        elif self._shadow.get(self.REG_SERVO2) == us_tilt:
+            self._shadow_write_word(self.REG_SERVO1, us_pan)
+
+        else:
+            # REG_SERVO1 and REG_SERVO2 are adjacent, little-endian words
+            self._cache_misses += 1
+            self._i2c_write_block(self.REG_SERVO1, [
+                us_pan & 0xff, us_pan >> 8,
+                us_tilt & 0xff, us_tilt >> 8])
+            self._shadow[self.REG_SERVO1] = us_pan
+            self._shadow[self.REG_SERVO2] = us_tilt
+
+    def _servo_read(self, reg):
+        """Read a servo pulse register, including any write held for the next frame."""
+
+        with self._frame_lock:
+            if reg in self._frame_pending:
+                return self._frame_pending[reg]
+
+        return self._shadow_read_word(reg)
+
+    def _frame_send(self, force=False):
+        """Send held servo writes whose frame interval has passed.
+
+        :param force: True = send all held writes now
+
+        """
+
+        with self._frame_lock:
+            if not self._frame_pending:
+                return
+
+            now = timer()
+            interval = self._frame_interval
+            due = {}
+
+            for reg, us in list(self._frame_pending.items()):
+                sent = self._frame_sent.get(reg)
+                if force or sent is None or now - sent >= interval:
+                    due[reg] = us
+                    del self._frame_pending[reg]
+                    self._frame_sent[reg] = now
+
+            if self._frame_pending:
+                delay = min(self._frame_sent[reg] + interval for reg in self._frame_pending) - now
+                if self._frame_timeout is None:
+                    self._frame_timeout = shared_scheduler().schedule(delay, self._frame_send)
+                else:
+                    self._frame_timeout.rearm(delay)
+
+            if due:
+                # Written under the lock, so a newer value can't overtake an older one
+                self._frame_writes += len(due)
+                self._servo_write_now(due)
+
+    def frame_coalescing(self, interval):
+        """Limit servo writes to one per PWM frame.
+
+        Servos only pick up a new pulse time once per frame, around 20ms,
+        so anything written more often than that is never seen. When enabled,
+        the first write to a servo is sent immediately, and further writes
+        within the interval are held back and merged, so only the newest
+        value is sent once the interval has passed.
+
+        :param interval: Minimum time between writes to each servo in seconds, eg: 0.02, or None to send every write immediately
+
+        """
+
+        if interval is not None and interval <= 0:
+            raise ValueError("Interval should be greater than 0")
+
+        if interval is None:
+            self._frame_send(force=True)
+
+        self._frame_interval = interval
+
+    def frame_info(self):
+        """Returns frame coalescing statistics.
+
+        The number of servo commands given, coalesced into a newer command
+        for the same servo, and actually written.
+
+        """
+
+        return {
+            'commands': self._frame_commands,
+            'coalesced': self._frame_coalesced,
+            'written': self._frame_writes}
+
     pan = servo_one
     tilt = servo_two
     get_pan = get_servo_one
     get_tilt = get_servo_two
+    pan_us = servo_one_us
+    tilt_us = servo_two_us
+    get_pan_us = get_servo_one_us
+    get_tilt_us = get_servo_two_us
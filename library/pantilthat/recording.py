@@ -0,0 +1,192 @@
+import mmap
+import struct
+
+from .motion import PlaybackStats, _play_samples
+from .pantilt import PanTilt
+
+
+MAGIC = b'PTA1'
+# Magic, pixel count, light type, bytes per pixel, frames per second, frame count
+_HEADER = struct.Struct('<4sHBBfI')
+FRAME_SIZE = PanTilt.NUM_LEDS * 3 + 1
+
+
+class Recorder:
+    """Records the LED frames a PanTilt sends
+
+    Every call to show() while recording adds a frame to the file,
+    exactly as it was sent to the LED registers, so an effect that is
+    expensive to compute can be rendered once and played back with
+    Player at no cost::
+
+        with Recorder('rainbow.pta', pantilthat.pantilthat, fps=30):
+            for x in range(300):
+                render_rainbow(x)
+                pantilthat.show()
+
+    The file is a 16 byte header followed by 73 bytes per frame.
+
+    """
+
+    def __init__(self, file, pantilt, fps=30):
+        """Start recording.
+
+        :param file: Filename, or a seekable file opened in binary mode
+        :param pantilt: PanTilt instance to record
+        :param fps: Playback rate of the recording, in frames per second
+
+        """
+
+        if fps <= 0:
+            raise ValueError("fps should be greater than 0")
+
+        if pantilt._recorder is not None:
+            raise ValueError("PanTilt is already being recorded")
+
+        self._owns_file = not hasattr(file, 'write')
+        self._file = open(file, 'wb') if self._owns_file else file
+        self._start = self._file.tell()
+        self._pantilt = pantilt
+        self._light_type = pantilt._light_type
+        self._pixels = pantilt.num_pixels()
+        self._stride = pantilt._pixel_stride
+        self.fps = fps
+        self.frames = 0
+
+        self._write_header()
+        pantilt._recorder = self
+
+    def _write_header(self):
+        self._file.write(_HEADER.pack(MAGIC, self._pixels, self._light_type, self._stride, self.fps, self.frames))
+
+    def _frame(self, data):
+        self._file.write(data)
+        self.frames += 1
+
+    def close(self):
+        """Stop recording, and finish the file."""
+
+        if self._pantilt is None:
+            return
+
+        self._pantilt._recorder = None
+        self._pantilt = None
+
+        end = self._file.tell()
+        self._file.seek(self._start)
+        self._write_header()
+        self._file.seek(end)
+
+        if self._owns_file:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Player:
+    """Plays LED frames recorded with Recorder
+
+    The file is memory mapped, and each frame is sent straight from the
+    map to the LED registers with PanTilt.show_raw, so playback costs the
+    same however complex the recorded effect was::
+
+        with Player('rainbow.pta') as player:
+            player.play(pantilthat.pantilthat, loop=True)
+
+    """
+
+    def __init__(self, file):
+        """Open a recording.
+
+        :param file: Filename, or a file opened in binary mode
+
+        """
+
+        self._owns_file = not hasattr(file, 'fileno')
+        self._file = open(file, 'rb') if self._owns_file else file
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+        try:
+            magic, pixels, light_type, stride, fps, frames = _HEADER.unpack_from(self._map)
+        except struct.error:
+            magic = None
+
+        if magic != MAGIC or len(self._map) != _HEADER.size + frames * FRAME_SIZE:
+            self.close()
+            raise ValueError("Not a PanTilt HAT animation file")
+
+        self.pixels = pixels
+        self.light_type = light_type
+        self.fps = fps
+        self.frames = frames
+
+    @property
+    def duration(self):
+        """Playback time in seconds."""
+
+        return self.frames / float(self.fps)
+
+    def frame(self, index):
+        """Returns a frame as a read only view of the LED register data.
+
+        :param index: Frame number, from 0
+
+        """
+
+        if index < 0 or index >= self.frames:
+            raise IndexError("Frame {index} out of range".format(index=index))
+
+        start = _HEADER.size + index * FRAME_SIZE
+        return self._view[start:start + FRAME_SIZE]
+
+    def play(self, pantilt, loop=False, stop=None, stats=None):
+        """Play the recording at its frame rate.
+
+        Frames that fall behind are skipped and counted as merged.
+
+        Returns a PlaybackStats.
+
+        :param pantilt: PanTilt instance to play on, set to the light type it was recorded with
+        :param loop: True = repeat until stopped
+        :param stop: Optional threading.Event, as for play_trajectory
+        :param stats: Optional PlaybackStats to update, as for play_trajectory
+
+        """
+
+        if pantilt._light_type != self.light_type:
+            raise ValueError("Recording was made for a different light type")
+
+        if stats is None:
+            stats = PlaybackStats()
+
+        while self.frames:
+            finished = _play_samples(self.frames, self.fps, lambda index: pantilt.show_raw(self.frame(index)), stop, stats)
+
+            if not (finished and loop):
+                break
+
+        return stats
+
+    def close(self):
+        """Close the recording."""
+
+        if self._map is None:
+            return
+
+        self._view.release()
+        self._map.close()
+        self._map = None
+
+        if self._owns_file:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,191 @@
+import random
+import threading
+import time
+
+
+class CircuitOpenError(IOError):
+    """Raised instead of using the bus while a CircuitBreaker is open."""
+
+    pass
+
+
+class RetryPolicy:
+    """Fixed i2c retry policy
+
+    Tries an i2c transfer a fixed number of times, waiting
+    the same amount of time between each attempt.
+
+    """
+
+    def __init__(self, retries=10, delay=0.01):
+        """Create a fixed retry policy.
+
+        :param retries: Number of attempts before giving up
+        :param delay: Time to wait between attempts in seconds
+
+        """
+
+        self.retries = retries
+        self.delay = delay
+
+    def delays(self):
+        """Yield the time to wait before each attempt.
+
+        Iteration stops when no further attempts should be made.
+
+        """
+
+        yield 0
+        for x in range(self.retries - 1):
+            yield self.delay
+
+    def bind(self, probe):
+        """Supply a function that checks whether the device is responding.
+
+        :param probe: Function that raises IOError if the device is not responding
+
+        """
+
+        pass
+
+    def allow(self):
+        """Raise CircuitOpenError if the bus should not be used at all."""
+
+        pass
+
+    def success(self):
+        """Record a transfer that succeeded."""
+
+        pass
+
+    def failure(self):
+        """Record a transfer that failed after all of its attempts."""
+
+        pass
+
+
+class BackoffPolicy(RetryPolicy):
+    """Exponential backoff i2c retry policy
+
+    Waits exponentially longer between attempts, with random jitter so
+    several devices sharing a bus do not retry in lockstep, and gives
+    up once a transfer has taken longer than its deadline.
+
+    """
+
+    def __init__(self, retries=10, delay=0.001, max_delay=0.02, multiplier=2.0, jitter=0.5, deadline=0.05):
+        """Create an exponential backoff retry policy.
+
+        :param retries: Maximum number of attempts before giving up
+        :param delay: Time to wait before the first retry in seconds
+        :param max_delay: Longest time to wait between attempts in seconds
+        :param multiplier: Factor the wait grows by after each attempt
+        :param jitter: Fraction, from 0 to 1, of each wait that is randomised
+        :param deadline: Maximum time in seconds to spend on one transfer, or None
+
+        """
+
+        RetryPolicy.__init__(self, retries, delay)
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+
+    def delays(self):
+        start = time.time()
+        delay = self.delay
+
+        yield 0
+        for x in range(self.retries - 1):
+            wait = delay * random.uniform(1.0 - self.jitter, 1.0)
+            if self.deadline is not None and time.time() + wait - start > self.deadline:
+                return
+
+            yield wait
+            delay = min(delay * self.multiplier, self.max_delay)
+
+
+class CircuitBreaker(RetryPolicy):
+    """Circuit breaker i2c retry policy
+
+    Wraps another retry policy. After a number of consecutive failed
+    transfers the breaker opens, and every transfer fails immediately
+    with CircuitOpenError rather than waiting on an unresponsive device.
+
+    While open, the device is probed in the background and the breaker
+    closes again as soon as it responds.
+
+    """
+
+    def __init__(self, policy=None, threshold=3, probe_interval=1.0):
+        """Create a circuit breaker.
+
+        :param policy: Retry policy to use while closed, default RetryPolicy()
+        :param threshold: Number of consecutive failed transfers that opens the breaker
+        :param probe_interval: Time between probes of the device in seconds, while open
+
+        """
+
+        self.policy = policy if policy is not None else RetryPolicy()
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+
+        self._probe = None
+        self._failures = 0
+        self._open_since = None
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        """Returns True if transfers are currently failing fast."""
+
+        return self._open_since is not None
+
+    def delays(self):
+        return self.policy.delays()
+
+    def bind(self, probe):
+        self._probe = probe
+        self.policy.bind(probe)
+
+    def allow(self):
+        with self._lock:
+            if self._open_since is None:
+                return
+
+            # With no probe, let a single transfer through once the interval has passed
+            if self._probe is None and time.time() - self._open_since >= self.probe_interval:
+                self._open_since = time.time()
+                return
+
+        raise CircuitOpenError("Device is not responding")
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._open_since = None
+
+        self.policy.success()
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            opening = self._open_since is None and self._failures >= self.threshold
+            if opening:
+                self._open_since = time.time()
+
+        if opening and self._probe is not None:
+            thread = threading.Thread(target=self._run_probe)
+            thread.daemon = True
+            thread.start()
+
+        self.policy.failure()
+
+    def _run_probe(self):
+        while self._open_since is not None:
+            time.sleep(self.probe_interval)
+            try:
+                self._probe()
+            except IOError:
+                continue
+
+            self.success()
@@ -0,0 +1,148 @@
+from timeit import default_timer as timer
+import heapq
+import itertools
+import threading
+import traceback
+
+
+class TimerHandle:
+    """A callback scheduled with TimerScheduler
+
+    The same handle can be re-armed any number of times, including
+    after it has fired, without creating a new thread or timer.
+
+    """
+
+    def __init__(self, scheduler, callback):
+        self._scheduler = scheduler
+        self._callback = callback
+        self._deadline = None
+        self._queued = None
+
+    def rearm(self, delay):
+        """(Re)schedule the callback to run delay seconds from now.
+
+        If the callback was already scheduled, the earlier time is discarded.
+
+        :param delay: Delay in seconds
+
+        """
+
+        self._scheduler._arm(self, timer() + delay)
+
+    def cancel(self):
+        """Stop the callback from running."""
+
+        self._scheduler._cancel(self)
+
+    def pending(self):
+        """Returns True if the callback is scheduled to run."""
+
+        return self._deadline is not None
+
+
+class TimerScheduler:
+    """Runs delayed callbacks from a single thread
+
+    Replaces creating a threading.Timer per timeout. Callbacks are kept
+    in a heap ordered by deadline. Pushing a deadline back, as happens
+    every time a servo moves and its idle timeout restarts, only updates
+    the handle; the heap entry is fixed up lazily when it comes due.
+
+    Callbacks run on the scheduler thread and should be short.
+
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._heap = []
+        self._counter = itertools.count()
+        self._thread = None
+
+    def schedule(self, delay, callback):
+        """Schedule a callback, returning a TimerHandle.
+
+        :param delay: Delay in seconds
+        :param callback: Function to call, with no arguments
+
+        """
+
+        handle = TimerHandle(self, callback)
+        handle.rearm(delay)
+        return handle
+
+    def _arm(self, handle, deadline):
+        with self._condition:
+            handle._deadline = deadline
+
+            # Only push if the handle isn't queued, or needs to run sooner than its queued entry
+            if handle._queued is None or deadline < handle._queued:
+                handle._queued = deadline
+                heapq.heappush(self._heap, (deadline, next(self._counter), handle))
+                if self._heap[0][2] is handle:
+                    self._condition.notify()
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _cancel(self, handle):
+        with self._condition:
+            handle._deadline = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+
+                    when, count, handle = self._heap[0]
+                    now = timer()
+                    if when > now:
+                        self._condition.wait(when - now)
+                        continue
+
+                    heapq.heappop(self._heap)
+
+                    if handle._queued != when:
+                        # A stale entry, superseded by an earlier one
+                        continue
+
+                    handle._queued = None
+
+                    if handle._deadline is None:
+                        continue
+
+                    if handle._deadline > now:
+                        # Re-armed since this entry was queued, queue it again for later
+                        handle._queued = handle._deadline
+                        heapq.heappush(self._heap, (handle._deadline, next(self._counter), handle))
+                        continue
+
+                    handle._deadline = None
+                    break
+
+            try:
+                handle._callback()
+            except Exception:
+                # Keep the shared thread alive, but don't hide the error
+                traceback.print_exc()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def shared_scheduler():
+    """Returns the TimerScheduler shared by all PanTilt instances."""
+
+    global _scheduler
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = TimerScheduler()
+
+        return _scheduler
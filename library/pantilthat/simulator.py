@@ -0,0 +1,188 @@
+from collections import deque
+from timeit import default_timer as timer
+import random
+import time
+
+from .pantilt import PanTilt
+from .transport import Transport
+
+
+class SimulatedHAT(Transport):
+    """Software model of PanTilt HAT
+
+    Behaves like a PanTilt HAT on an i2c bus, so the library can be
+    tested and benchmarked without hardware::
+
+        hat = SimulatedHAT()
+        pantilt = PanTilt(i2c_bus=hat)
+
+    Models the register map, the time each transfer takes on the bus,
+    the delay between REG_UPDATE and the LEDs changing, the 20ms servo
+    PWM frame, and randomly failing (NACKed) transfers.
+
+    By default time is simulated: transfers advance a virtual clock
+    rather than sleeping, and advance() moves it on. With realtime=True
+    transfers sleep for as long as they would take on a real bus.
+
+    """
+
+    NUM_REGISTERS = 0x4F
+    LED_BYTES = PanTilt.NUM_LEDS * 3
+
+    def __init__(self,
+                 address=0x15,
+                 bus_speed=100000,
+                 realtime=False,
+                 nack_rate=0.0,
+                 seed=None,
+                 update_wait=PanTilt.UPDATE_WAIT,
+                 servo_frame=0.02):
+        """Create a simulated PanTilt HAT.
+
+        :param address: i2c address the HAT responds to
+        :param bus_speed: i2c clock in Hz, normally 100000 or 400000
+        :param realtime: True = sleep for the duration of transfers, False = use a virtual clock
+        :param nack_rate: Probability, from 0 to 1, of a transfer failing with IOError
+        :param seed: Random seed for repeatable failures
+        :param update_wait: Time in seconds from REG_UPDATE until the LEDs change
+        :param servo_frame: Servo PWM frame length in seconds
+
+        """
+
+        self.address = address
+        self.bus_speed = bus_speed
+        self.realtime = realtime
+        self.nack_rate = nack_rate
+        self.update_wait = update_wait
+        self.servo_frame = servo_frame
+
+        self.registers = bytearray(self.NUM_REGISTERS)
+
+        self.transactions = 0
+        self.bytes = 0
+        self.nacks = 0
+        self.bus_time = 0.0
+
+        self._random = random.Random(seed)
+        self._clock = 0.0
+        self._start = timer()
+
+        self._leds = bytearray(self.LED_BYTES)
+        self._latch = None
+
+        # Pulse output of each servo over time, as (time, microseconds) pairs
+        self._servo_history = [deque([(0.0, 0)], maxlen=256), deque([(0.0, 0)], maxlen=256)]
+
+    def time(self):
+        """Returns the simulator's current time in seconds."""
+
+        if self.realtime:
+            return timer() - self._start
+
+        return self._clock
+
+    def advance(self, seconds):
+        """Move time on, as if the HAT had been left alone.
+
+        :param seconds: Time in seconds
+
+        """
+
+        if self.realtime:
+            time.sleep(seconds)
+        else:
+            self._clock += seconds
+
+    def leds(self):
+        """Returns the LED data currently displayed, as bytes in register order."""
+
+        self._update_latch()
+        return bytes(self._leds)
+
+    def servo_pulse(self, index, at=None):
+        """Returns the pulse width a servo is being driven with.
+
+        New servo values only take effect at the start of a PWM frame,
+        so this returns the value that was set when the frame containing
+        the given time began, or 0 if the servo was disabled.
+
+        :param index: Servo index: either 1 or 2
+        :param at: Time to look up, defaults to now
+
+        """
+
+        if at is None:
+            at = self.time()
+
+        frame_start = int(at / self.servo_frame) * self.servo_frame
+
+        for when, us in reversed(self._servo_history[index - 1]):
+            if when <= frame_start:
+                return us
+
+        return 0
+
+    def _update_latch(self):
+        if self._latch is not None and self.time() >= self._latch[0]:
+            self._leds = self._latch[1]
+            self._latch = None
+
+    def _transfer(self, addr, data_bytes, messages=1):
+        """Account for the bus time of a transfer, or fail it with a NACK.
+
+        Every message is a start (or repeated start) and an address byte,
+        every byte is 9 clocks including the acknowledge, plus a final stop.
+
+        """
+
+        self.transactions += 1
+
+        if addr != self.address or self._random.random() < self.nack_rate:
+            self.nacks += 1
+            self._elapse(11.0 / self.bus_speed)
+            raise IOError("NACK from device 0x{addr:02x}".format(addr=addr))
+
+        self.bytes += data_bytes
+        self._elapse(((data_bytes + messages) * 9 + messages + 1) / float(self.bus_speed))
+
+    def _elapse(self, seconds):
+        self.bus_time += seconds
+        self.advance(seconds)
+        self._update_latch()
+
+    def _store(self, reg, data):
+        self.registers[reg:reg + len(data)] = bytearray(data)
+        end = reg + len(data)
+        now = self.time()
+
+        if reg <= PanTilt.REG_UPDATE < end and self.registers[PanTilt.REG_UPDATE]:
+            start = PanTilt.REG_WS2812
+            self._latch = (now + self.update_wait, self.registers[start:start + self.LED_BYTES])
+
+        if reg < PanTilt.REG_WS2812 and end > PanTilt.REG_CONFIG:
+            config = self.registers[PanTilt.REG_CONFIG]
+            for index, servo_reg in enumerate((PanTilt.REG_SERVO1, PanTilt.REG_SERVO2)):
+                us = self.registers[servo_reg] | (self.registers[servo_reg + 1] << 8)
+                enabled = config & (1 << index)
+                self._servo_history[index].append((now, us if enabled else 0))
+
+    def _load(self, reg, length):
+        return self.registers[reg:reg + length]
+
+    def write_i2c_block_data(self, addr, reg, data):
+        self._transfer(addr, len(data) + 1)
+        self._store(reg, data)
+
+    def write_many(self, addr, writes):
+        self._transfer(addr, sum(len(data) + 1 for reg, data in writes), len(writes))
+        for reg, data in writes:
+            self._store(reg, data)
+
+    def read_byte_data(self, addr, reg):
+        self._transfer(addr, 2, 2)
+        return self._load(reg, 1)[0]
+
+    def read_word_data(self, addr, reg):
+        self._transfer(addr, 3, 2)
+        data = self._load(reg, 2)
+        return data[0] | (data[1] << 8)
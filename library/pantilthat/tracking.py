@@ -0,0 +1,226 @@
+from timeit import default_timer as timer
+
+
+class PID:
+    """PID controller
+
+    Integral wind-up is prevented by clamping the integral term, and by
+    not integrating while the output is saturated in the same direction.
+
+    Errors smaller than the deadband give an output of zero and clear
+    the integral, so the controller holds still instead of chasing noise.
+
+    """
+
+    def __init__(self, kp, ki=0.0, kd=0.0, output_limit=None, integral_limit=None, deadband=0.0):
+        """Create a PID controller.
+
+        :param kp: Proportional gain
+        :param ki: Integral gain, per second
+        :param kd: Derivative gain, in seconds
+        :param output_limit: Maximum magnitude of the output, or None
+        :param integral_limit: Maximum magnitude of the integral term, or None
+        :param deadband: Errors smaller than this give an output of zero
+
+        """
+
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_limit = output_limit
+        self.integral_limit = integral_limit
+        self.deadband = deadband
+        self.reset()
+
+    def reset(self):
+        """Forget the integral and previous error."""
+
+        self._integral = 0.0
+        self._last_error = None
+
+    def update(self, error, dt):
+        """Returns the controller output for a new error measurement.
+
+        :param error: Error, in any unit
+        :param dt: Time since the last update in seconds
+
+        """
+
+        if abs(error) < self.deadband:
+            self._integral = 0.0
+            self._last_error = 0.0
+            return 0.0
+
+        derivative = 0.0
+        if self._last_error is not None and dt > 0:
+            derivative = (error - self._last_error) / dt
+        self._last_error = error
+
+        integral = self._integral + error * dt
+        if self.integral_limit is not None:
+            integral = max(-self.integral_limit, min(self.integral_limit, integral))
+
+        output = self.kp * error + self.ki * integral + self.kd * derivative
+
+        limit = self.output_limit
+        if limit is not None and abs(output) > limit:
+            output = limit if output > 0 else -limit
+            # Saturated: only let the integral shrink, never grow further
+            if abs(integral) < abs(self._integral):
+                self._integral = integral
+        else:
+            self._integral = integral
+
+        return output
+
+
+class TargetTracker:
+    """Keeps a target centred in a camera image
+
+    Give it the pixel position of the target in each camera frame and
+    it steers the pan/tilt head to bring the target to the centre, with
+    a PID controller for each axis.
+
+    Corrections are limited to max_speed, and the servos are only
+    written when the position has changed by at least min_step degrees,
+    so a steady target costs no i2c traffic at all.
+
+    """
+
+    def __init__(self, pantilt,
+                 resolution=(640, 480),
+                 fov=(62.2, 48.8),
+                 kp=0.5, ki=0.1, kd=0.0,
+                 deadband=0.5,
+                 max_speed=180.0,
+                 min_step=0.1,
+                 direction=(1, 1)):
+        """Create a target tracker.
+
+        :param pantilt: PanTilt instance to steer
+        :param resolution: Camera image (width, height) in pixels
+        :param fov: Camera field of view (horizontal, vertical) in degrees
+        :param kp: Proportional gain, degrees of correction per degree of error each frame
+        :param ki: Integral gain
+        :param kd: Derivative gain
+        :param deadband: Errors smaller than this, in degrees, are ignored
+        :param max_speed: Maximum slew rate in degrees per second
+        :param min_step: Smallest change in degrees worth sending to the servos
+        :param direction: (pan, tilt) multipliers; use -1 if an axis moves the wrong way
+
+        """
+
+        self._pantilt = pantilt
+        self._resolution = resolution
+        self._degrees_per_pixel = (float(fov[0]) / resolution[0], float(fov[1]) / resolution[1])
+        self._direction = direction
+        self._max_speed = max_speed
+        self._min_step = min_step
+        self._deadband = deadband
+
+        self.pids = (PID(kp, ki, kd, integral_limit=90, deadband=deadband),
+                     PID(kp, ki, kd, integral_limit=90, deadband=deadband))
+
+        self._position = None
+        self._written = None
+        self._last_update = None
+        self._unsettled_since = None
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset the tracking statistics."""
+
+        self._updates = 0
+        self._writes = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._settle_time = None
+
+    def stats(self):
+        """Returns tracking statistics.
+
+        * updates - target positions processed
+        * writes - updates that moved the servos
+        * latency_mean / latency_max - time spent in update(), in seconds
+        * settle_time - time from the target moving out of the deadband until it was centred again, for the last time it happened
+
+        """
+
+        return {
+            'updates': self._updates,
+            'writes': self._writes,
+            'latency_mean': self._latency_total / self._updates if self._updates else 0.0,
+            'latency_max': self._latency_max,
+            'settle_time': self._settle_time}
+
+    def lost(self):
+        """Call when the target is no longer visible, to stop the controllers winding up."""
+
+        for pid in self.pids:
+            pid.reset()
+        self._last_update = None
+
+    def position(self):
+        """Returns the current commanded (pan, tilt) position in degrees."""
+
+        if self._position is None:
+            self._position = (self._pantilt.get_pan(precise=True), self._pantilt.get_tilt(precise=True))
+            self._written = self._position
+
+        return self._position
+
+    def update(self, x, y, timestamp=None):
+        """Steer towards a new target position.
+
+        Returns the new commanded (pan, tilt) position in degrees.
+
+        The first update, and the first after lost(), only starts the
+        clock: with no frame interval to limit the slew rate by, the
+        head waits for the next update before it moves.
+
+        :param x: Horizontal pixel position of the target, 0 is the left of the image
+        :param y: Vertical pixel position of the target, 0 is the top of the image
+        :param timestamp: Time the frame was captured in seconds, defaults to now
+
+        """
+
+        start = timer()
+        if timestamp is None:
+            timestamp = start
+
+        dt = timestamp - self._last_update if self._last_update is not None else None
+        self._last_update = timestamp
+
+        errors = ((x - self._resolution[0] / 2.0) * self._degrees_per_pixel[0],
+                  (y - self._resolution[1] / 2.0) * self._degrees_per_pixel[1])
+
+        # Settle time: from leaving the deadband to being back inside it
+        centred = all(abs(error) < self._deadband for error in errors)
+        if not centred and self._unsettled_since is None:
+            self._unsettled_since = timestamp
+        elif centred and self._unsettled_since is not None:
+            self._settle_time = timestamp - self._unsettled_since
+            self._unsettled_since = None
+
+        if dt is not None:
+            position = []
+            for pid, error, current, direction in zip(self.pids, errors, self.position(), self._direction):
+                # Limiting the PID's output, rather than clamping it afterwards, stops the integral winding up
+                pid.output_limit = self._max_speed * max(0.0, dt)
+                step = pid.update(error, dt)
+                position.append(max(-90.0, min(90.0, current + step * direction)))
+
+            self._position = tuple(position)
+
+            if any(abs(new - old) >= self._min_step for new, old in zip(self._position, self._written)):
+                self._pantilt.pan_tilt(*self._position)
+                self._written = self._position
+                self._writes += 1
+
+        latency = timer() - start
+        self._updates += 1
+        self._latency_total += latency
+        self._latency_max = max(self._latency_max, latency)
+
+        return self.position()
@@ -0,0 +1,192 @@
+import numpy
+
+from .motion import PlaybackStats, _play_samples
+
+
+class Trajectory:
+    """A pan/tilt path sampled at a fixed rate
+
+    Positions are held as NumPy arrays, so whole paths can be built,
+    checked and converted to pulse times in a handful of array
+    operations instead of one Python iteration per sample::
+
+        path = lissajous(600, pan_frequency=0.03, tilt_frequency=0.05)
+        path.play(pantilthat.pantilthat)
+
+    """
+
+    def __init__(self, pan, tilt, rate=50):
+        """Create a trajectory from arrays of angles.
+
+        :param pan: Array-like of servo 1 angles in degrees from -90 to 90
+        :param tilt: Array-like of servo 2 angles in degrees from -90 to 90, or a single angle
+        :param rate: Samples per second
+
+        """
+
+        if rate <= 0:
+            raise ValueError("rate should be greater than 0")
+
+        pan, tilt = numpy.broadcast_arrays(numpy.asarray(pan, dtype=float), numpy.asarray(tilt, dtype=float))
+
+        if pan.ndim != 1:
+            raise ValueError("pan and tilt should be one dimensional")
+
+        for angles in (pan, tilt):
+            if angles.size and (angles.min() < -90 or angles.max() > 90):
+                raise ValueError("Angles should be between -90 and 90")
+
+        self.pan = pan
+        self.tilt = tilt
+        self.rate = rate
+
+    def __len__(self):
+        return len(self.pan)
+
+    @property
+    def duration(self):
+        """Playback time in seconds."""
+
+        return len(self.pan) / float(self.rate)
+
+    def times(self):
+        """Returns an array of the time of each sample, in seconds from the start."""
+
+        return numpy.arange(len(self.pan)) / float(self.rate)
+
+    def repeat(self, count):
+        """Returns a new trajectory that plays this one count times over.
+
+        :param count: Number of repeats
+
+        """
+
+        return Trajectory(numpy.tile(self.pan, count), numpy.tile(self.tilt, count), self.rate)
+
+    def then(self, other):
+        """Returns a new trajectory that plays this one followed by another.
+
+        :param other: Trajectory at the same rate
+
+        """
+
+        if other.rate != self.rate:
+            raise ValueError("Trajectories should have the same rate")
+
+        return Trajectory(numpy.concatenate((self.pan, other.pan)), numpy.concatenate((self.tilt, other.tilt)), self.rate)
+
+    def to_pulses(self, pantilt):
+        """Converts the trajectory into pulse times for a PanTilt.
+
+        Uses each servo's calibration table if one is set, otherwise
+        its servo_pulse_min/servo_pulse_max range.
+
+        Returns (pan, tilt) arrays of integer pulse times in microseconds.
+
+        :param pantilt: PanTilt instance the pulses are for
+
+        """
+
+        pulses = []
+
+        for index, angles in enumerate((self.pan, self.tilt)):
+            calibration = pantilt._servo_calibration[index]
+            if calibration is not None:
+                us = calibration.to_us_many(angles)
+            else:
+                us = pantilt._servo_centre[index] + angles * pantilt._servo_scale[index]
+
+            pulses.append(numpy.rint(us).astype(int))
+
+        return tuple(pulses)
+
+    def play(self, pantilt, stop=None, stats=None):
+        """Play the trajectory on a PanTilt.
+
+        Pulse times are computed before playback starts, so the playback
+        loop only sleeps and writes. Samples that fall behind are skipped
+        and counted as merged, but the final sample is always sent.
+
+        Returns a PlaybackStats.
+
+        :param pantilt: PanTilt instance to move
+        :param stop: Optional threading.Event, as for play_trajectory
+        :param stats: Optional PlaybackStats to update, as for play_trajectory
+
+        """
+
+        if stats is None:
+            stats = PlaybackStats()
+
+        pan, tilt = self.to_pulses(pantilt)
+        pan = pan.tolist()
+        tilt = tilt.tolist()
+
+        _play_samples(len(pan), self.rate, lambda index: pantilt.pan_tilt_us(pan[index], tilt[index]), stop, stats)
+
+        return stats
+
+
+def _samples(duration, rate):
+    return numpy.arange(int(round(duration * rate))) / float(rate)
+
+
+def sweep(duration, period=4.0, pan=(-90, 90), tilt=(0, 0), rate=50):
+    """Sweep smoothly back and forth, following a sine wave.
+
+    :param duration: Length of the trajectory in seconds
+    :param period: Time in seconds for one sweep there and back
+    :param pan: (min, max) pan angles in degrees
+    :param tilt: (min, max) tilt angles in degrees, swept in step with pan
+    :param rate: Samples per second
+
+    """
+
+    wave = numpy.sin(_samples(duration, rate) * (2 * numpy.pi / period))
+
+    return Trajectory(
+        (pan[0] + pan[1]) / 2.0 + wave * (pan[1] - pan[0]) / 2.0,
+        (tilt[0] + tilt[1]) / 2.0 + wave * (tilt[1] - tilt[0]) / 2.0,
+        rate)
+
+
+def raster(rows, row_time, pan=(-90, 90), tilt=(-45, 45), rate=50):
+    """Scan back and forth across the pan range, stepping tilt between rows.
+
+    :param rows: Number of rows to scan
+    :param row_time: Time in seconds to scan each row
+    :param pan: (start, end) pan angles in degrees
+    :param tilt: (first, last) row tilt angles in degrees
+    :param rate: Samples per second
+
+    """
+
+    per_row = max(int(round(row_time * rate)), 2)
+    row = numpy.linspace(pan[0], pan[1], per_row)
+
+    # Alternate rows run backwards, so there's no jump back to the start of each row
+    pan_angles = numpy.tile(numpy.concatenate((row, row[::-1])), (rows + 1) // 2)[:rows * per_row]
+    tilt_angles = numpy.repeat(numpy.linspace(tilt[0], tilt[1], rows), per_row)
+
+    return Trajectory(pan_angles, tilt_angles, rate)
+
+
+def lissajous(duration, pan_frequency=0.1, tilt_frequency=0.15, pan=(-90, 90), tilt=(-45, 45), phase=numpy.pi / 2, rate=50):
+    """Trace a Lissajous figure, which covers the field of view without sharp turns.
+
+    :param duration: Length of the trajectory in seconds
+    :param pan_frequency: Pan oscillations per second
+    :param tilt_frequency: Tilt oscillations per second
+    :param pan: (min, max) pan angles in degrees
+    :param tilt: (min, max) tilt angles in degrees
+    :param phase: Phase of pan ahead of tilt, in radians
+    :param rate: Samples per second
+
+    """
+
+    t = _samples(duration, rate) * (2 * numpy.pi)
+
+    return Trajectory(
+        (pan[0] + pan[1]) / 2.0 + numpy.sin(t * pan_frequency + phase) * (pan[1] - pan[0]) / 2.0,
+        (tilt[0] + tilt[1]) / 2.0 + numpy.sin(t * tilt_frequency) * (tilt[1] - tilt[0]) / 2.0,
+        rate)
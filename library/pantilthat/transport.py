@@ -0,0 +1,194 @@
+import ctypes
+import os
+
+
+I2C_RDWR = 0x0707
+I2C_M_RD = 0x0001
+
+
+class Transport:
+    """i2c transport interface
+
+    PanTilt talks to the bus through a transport. Transports provide the
+    SMBus methods used by the library, plus write_many for sending several
+    register writes at once.
+
+    Block data may be a list of ints, bytes, bytearray or memoryview.
+
+    """
+
+    def write_i2c_block_data(self, addr, reg, data):
+        raise NotImplementedError
+
+    def write_word_data(self, addr, reg, data):
+        self.write_i2c_block_data(addr, reg, [data & 0xff, (data >> 8) & 0xff])
+
+    def write_byte_data(self, addr, reg, data):
+        self.write_i2c_block_data(addr, reg, [data & 0xff])
+
+    def read_byte_data(self, addr, reg):
+        raise NotImplementedError
+
+    def read_word_data(self, addr, reg):
+        raise NotImplementedError
+
+    def write_many(self, addr, writes):
+        """Write several blocks of registers.
+
+        Backends that support combined transactions send all of the
+        writes in one transaction, otherwise they are sent one by one.
+
+        :param addr: i2c address of the device
+        :param writes: List of (register, data) tuples
+
+        """
+
+        for reg, data in writes:
+            self.write_i2c_block_data(addr, reg, data)
+
+
+class SMBusTransport(Transport):
+    """Transport for an smbus.SMBus compatible object."""
+
+    def __init__(self, bus):
+        """Wrap an SMBus compatible object.
+
+        :param bus: An object with SMBus style read/write methods
+
+        """
+
+        self._bus = bus
+
+    def write_i2c_block_data(self, addr, reg, data):
+        if type(data) is not list:
+            data = list(bytearray(data))
+
+        self._bus.write_i2c_block_data(addr, reg, data)
+
+    def write_word_data(self, addr, reg, data):
+        self._bus.write_word_data(addr, reg, data)
+
+    def write_byte_data(self, addr, reg, data):
+        self._bus.write_byte_data(addr, reg, data)
+
+    def read_byte_data(self, addr, reg):
+        return self._bus.read_byte_data(addr, reg)
+
+    def read_word_data(self, addr, reg):
+        return self._bus.read_word_data(addr, reg)
+
+
+class SMBus2Transport(SMBusTransport):
+    """Transport using the smbus2 library.
+
+    write_many is sent as a single combined i2c_rdwr transaction.
+
+    """
+
+    def __init__(self, bus=1):
+        """Open an i2c bus with smbus2.
+
+        :param bus: i2c bus number, or an existing smbus2.SMBus
+
+        """
+
+        import smbus2
+
+        self._i2c_msg = smbus2.i2c_msg
+
+        if isinstance(bus, int):
+            bus = smbus2.SMBus(bus)
+
+        SMBusTransport.__init__(self, bus)
+
+    def write_many(self, addr, writes):
+        msgs = []
+        for reg, data in writes:
+            buf = bytearray([reg])
+            buf.extend(bytearray(data))
+            msgs.append(self._i2c_msg.write(addr, buf))
+
+        self._bus.i2c_rdwr(*msgs)
+
+
+class _I2CMsg(ctypes.Structure):
+    _fields_ = [
+        ('addr', ctypes.c_uint16),
+        ('flags', ctypes.c_uint16),
+        ('len', ctypes.c_uint16),
+        ('buf', ctypes.POINTER(ctypes.c_uint8))]
+
+
+class _I2CRdwrIoctlData(ctypes.Structure):
+    _fields_ = [
+        ('msgs', ctypes.POINTER(_I2CMsg)),
+        ('nmsgs', ctypes.c_uint32)]
+
+
+class I2CDevTransport(Transport):
+    """Transport using the Linux /dev/i2c-N device directly.
+
+    Every transfer is a single I2C_RDWR ioctl, and write_many sends
+    all of its writes as one combined transaction. Block data is copied
+    straight from bytes, bytearray or memoryview buffers.
+
+    """
+
+    def __init__(self, bus=1, fd=None, ioctl=None):
+        """Open an i2c bus device.
+
+        :param bus: i2c bus number, opens /dev/i2c-<bus>
+        :param fd: Use an already open file descriptor instead
+        :param ioctl: Function used in place of fcntl.ioctl, for testing
+
+        """
+
+        if ioctl is None:
+            import fcntl
+            ioctl = fcntl.ioctl
+
+        if fd is None:
+            fd = os.open("/dev/i2c-{bus}".format(bus=bus), os.O_RDWR)
+
+        self._fd = fd
+        self._ioctl = ioctl
+
+    def close(self):
+        """Close the i2c bus device."""
+
+        os.close(self._fd)
+
+    def _message(self, addr, reg, data, flags=0):
+        if reg is None:
+            buf = bytearray(data)
+        else:
+            buf = bytearray(len(data) + 1)
+            buf[0] = reg
+            buf[1:] = data
+
+        msg = _I2CMsg(addr, flags, len(buf), (ctypes.c_uint8 * len(buf)).from_buffer(buf))
+        # Keep the buffer alive for as long as the message
+        msg._buffer = buf
+        return msg
+
+    def _transfer(self, msgs):
+        array = (_I2CMsg * len(msgs))(*msgs)
+        self._ioctl(self._fd, I2C_RDWR, _I2CRdwrIoctlData(array, len(msgs)))
+
+    def write_i2c_block_data(self, addr, reg, data):
+        self._transfer([self._message(addr, reg, data)])
+
+    def write_many(self, addr, writes):
+        self._transfer([self._message(addr, reg, data) for reg, data in writes])
+
+    def _read(self, addr, reg, length):
+        result = self._message(addr, None, bytearray(length), I2C_M_RD)
+        self._transfer([self._message(addr, None, bytearray([reg])), result])
+        return result._buffer
+
+    def read_byte_data(self, addr, reg):
+        return self._read(addr, reg, 1)[0]
+
+    def read_word_data(self, addr, reg):
+        data = self._read(addr, reg, 2)
+        return data[0] | (data[1] << 8)
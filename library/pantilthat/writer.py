@@ -0,0 +1,172 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class BusWriter:
+    """Background i2c writer
+
+    Queues register writes and sends them to the bus from a single
+    worker thread, so callers never wait on i2c.
+
+    Writes to a register that is still queued replace the queued
+    value, so only the newest value for each register is sent. A write
+    inside a queued block, such as one servo of a pan_tilt, is folded
+    into the block rather than replacing it.
+
+    """
+
+    def __init__(self, write, failed=None):
+        """Start the worker thread.
+
+        :param write: Function called as write(reg, method, data, message) to perform a write
+        :param failed: Optional function called as failed(reg, method, data) when a write fails
+
+        """
+
+        self._write = write
+        self._failed = failed
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self._busy = False
+        self._running = True
+        self._error = None
+
+        self._queued = 0
+        self._merged = 0
+        self._written = 0
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, reg, method, data, message):
+        """Queue a register write, replacing or updating any overlapping write still queued."""
+
+        length = _length(method, data)
+
+        with self._condition:
+            self._queued += 1
+            self._condition.notify()
+
+            for other, (other_method, other_data, other_message) in list(self._pending.items()):
+                other_length = _length(other_method, other_data)
+
+                if reg <= other and other + other_length <= reg + length:
+                    # Completely covered by the new write
+                    del self._pending[other]
+                    self._merged += 1
+
+                elif other <= reg and reg + length <= other + other_length:
+                    # Inside a queued block, so update that block instead of replacing it
+                    block = bytearray(other_data)
+                    block[reg - other:reg - other + length] = _as_bytes(method, data)
+                    del self._pending[other]
+                    self._pending[other] = (other_method, block, other_message)
+                    self._merged += 1
+                    return
+
+            # Re-inserting keeps the queue in the order the registers were last written,
+            # so REG_UPDATE is always sent after the LED blocks that preceded it
+            self._pending[reg] = (method, data, message)
+
+    def flush(self, timeout=None):
+        """Wait for all queued writes to reach the bus.
+
+        Raises the last IOError encountered by the worker, if any.
+
+        :param timeout: Maximum time to wait in seconds, or None to wait forever
+
+        """
+
+        deadline = None if timeout is None else time.time() + timeout
+
+        with self._condition:
+            while self._pending or self._busy:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+
+                self._condition.wait(remaining)
+
+            error, self._error = self._error, None
+
+        if error is not None:
+            raise error
+
+    def stop(self):
+        """Flush any queued writes and stop the worker thread."""
+
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+        self._thread.join()
+
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def info(self):
+        """Returns the number of writes queued, merged into newer writes and sent to the bus."""
+
+        return {'queued': self._queued, 'merged': self._merged, 'written': self._written}
+
+    def reset(self):
+        """Reset the write counts to zero."""
+
+        self._queued = 0
+        self._merged = 0
+        self._written = 0
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait()
+
+                if not self._pending:
+                    return
+
+                batch = list(self._pending.items())
+                self._pending.clear()
+                self._busy = True
+
+            for reg, (method, data, message) in batch:
+                try:
+                    self._write(reg, method, data, message)
+                    self._written += 1
+                except IOError as e:
+                    self._error = e
+                    if self._failed is not None:
+                        self._failed(reg, method, data)
+
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+
+
+def _as_bytes(method, data):
+    """Returns the bytes a write puts in its registers, in register order."""
+
+    if method == 'write_word_data':
+        return bytearray((data & 0xff, data >> 8))
+
+    if method == 'write_byte_data':
+        return bytearray((data,))
+
+    return bytearray(data)
+
+
+def _length(method, data):
+    """Returns the number of registers a write covers."""
+
+    if method == 'write_word_data':
+        return 2
+
+    if method == 'write_byte_data':
+        return 1
+
+    return len(data)
@@ -49,6 +49,6 @@ setup(
     url             = 'http://www.pimoroni.com',
     classifiers     = classifiers,
     py_modules      = [],
-    packages        = ['pantilthat'],
+    packages        = ['pantilthat', 'pantilthat.bench'],
     install_requires= []
 )
@@ -60,8 +60,8 @@ class SMBus:
     def write_word_data(self, addr, reg, data):
         global regs
 
-        regs[reg] = (data >> 8) & 0xff
-        regs[reg + 1] = data & 0xff
+        regs[reg] = data & 0xff
+        regs[reg + 1] = (data >> 8) & 0xff
         self._debug(addr, reg, data)
 
     def write_byte_data(self, addr, reg, data):
@@ -79,7 +79,7 @@ class SMBus:
     def read_word_data(self, addr, reg):
         global regs
 
-        return (regs[reg] << 8) | regs[reg + 1]
+        return regs[reg] | (regs[reg + 1] << 8)
 
 
 def i2c_assert(action, expect, message):
@@ -151,11 +151,16 @@ print("OK!")
 
 # Check every method we expect to exit, actually exists
 print("\nTesting for API consistency...")
-for method in ["idle_timeout", "servo_enable", "servo_pulse_max", "servo_pulse_min",
+for method in ["idle_timeout", "servo_enable", "servo_pulse_max", "servo_pulse_min", "servo_calibration",
                "brightness", "clear", "light_mode", "light_type", "set_all",
-               "set_pixel", "set_pixel_rgbw", "show",
+               "set_pixel", "set_pixel_rgbw", "set_pixels", "num_pixels", "show", "show_raw", "gamma", "pixel_brightness", "bytes_saved", "refresh", "cache_info",
+               "background_writes", "flush", "writer_info", "retry_policy",
+               "instrumentation", "stats", "reset_stats",
                "servo_one", "pan", "get_pan", "get_servo_one",
-               "servo_two", "tilt", "get_tilt", "get_servo_two"]:
+               "servo_two", "tilt", "get_tilt", "get_servo_two", "pan_tilt",
+               "servo_one_us", "pan_us", "get_servo_one_us", "get_pan_us",
+               "servo_two_us", "tilt_us", "get_servo_two_us", "get_tilt_us", "pan_tilt_us",
+               "frame_coalescing", "frame_info", "servo_speed", "estimated_position", "wait_until_settled"]:
 
     assert hasattr(pt, method), "Method {method}() should exist!".format(method=method)
     assert callable(getattr(pt, method)), "Method {method}() should be callable!".format(method=method)
@@ -182,13 +187,13 @@ print("\n=== SERVOS ===")
 
 print("\nSetting servo one to 0 degrees...")
 i2c_assert(lambda: pt.servo_one(0), 
-           lambda: regs[REG_SERVO1] == 5 and regs[REG_SERVO1 + 1] == 125,
+           lambda: regs[REG_SERVO1] == 125 and regs[REG_SERVO1 + 1] == 5,
            "Servo 1 regs contain incorrect value!")
 print("OK!")
 
 print("\nSetting servo two to 0 degrees...")
 i2c_assert(lambda: pt.servo_two(0),
-           lambda: regs[REG_SERVO2] == 5 and regs[REG_SERVO2 + 1] == 125,
+           lambda: regs[REG_SERVO2] == 125 and regs[REG_SERVO2 + 1] == 5,
            "Servo 2 regs contain incorrect value!")
 print("OK!")
 
@@ -202,6 +207,81 @@ for x in range(-90, 91):
     assert pt.get_pan() == x, "get_pan() should return {}, returned {}".format(x, pt.get_pan())
     assert pt.get_tilt() == x, "get_tilt() should return {}, returned {}".format(x, pt.get_tilt())
 
+print("\nTesting pan_tilt...")
+for x in range(-90, 91):
+    pt.pan_tilt(x, -x)
+    assert pt.get_pan() == x, "get_pan() should return {}, returned {}".format(x, pt.get_pan())
+    assert pt.get_tilt() == -x, "get_tilt() should return {}, returned {}".format(-x, pt.get_tilt())
+
+i2c_assert(lambda: pt.pan_tilt(0, 0),
+           lambda: regs[REG_SERVO1:REG_SERVO2 + 2] == [125, 5, 125, 5],
+           "Servo regs contain incorrect value!")
+print("OK!")
+
+print("\nTesting microsecond and fractional angle control...")
+pt.servo_one_us(1500)
+assert pt.get_servo_one_us() == 1500 and regs[REG_SERVO1] | (regs[REG_SERVO1 + 1] << 8) == 1500, "servo_one_us() should set the pulse time"
+pt.tilt_us(2300)
+assert pt.get_tilt() == 90, "tilt_us() should set the pulse time"
+assert_raises(lambda: pt.servo_one_us(2301), ValueError, "ValueError not raised by servo_one_us out of range")
+
+pt.pan(12.3)
+assert abs(pt.get_pan(precise=True) - 12.3) < 0.06, "pan() should accept fractional degrees"
+assert pt.get_pan() == 12, "get_pan() should round to whole degrees"
+pt.pan(12.4)
+assert pt.get_pan_us() == 1528, "Pulse time should be rounded to the nearest microsecond"
+
+pt.servo_pulse_min(1, 1000)
+pt.servo_pulse_max(1, 2000)
+pt.pan(-45)
+assert pt.get_pan_us() == 1250, "Angle mapping should follow servo_pulse_min/servo_pulse_max"
+pt.servo_pulse_min(1, 510)
+pt.servo_pulse_max(1, 2300)
+pt.tilt(0)
+print("OK!")
+
+print("\nTesting servo calibration...")
+import io
+from pantilthat.calibration import calibrate
+cal = pantilthat.Calibration([(90, 2200), (-90, 600), (0, 1500), (45, 1900)])
+assert cal.to_us(-45) == 1050 and cal.to_us(60) == 2000, "Calibration should interpolate between points"
+assert cal.to_degrees(2000) == 60, "Calibration should convert pulses back to angles"
+assert list(cal.to_us_many([-90, 0, 67.5])) == [600, 1500, 2050], "to_us_many() should convert every angle"
+assert_raises(lambda: pantilthat.Calibration([(0, 1500), (10, 1400), (20, 1600)]), ValueError,
+              "ValueError not raised by non-monotonic calibration")
+
+f = io.BytesIO()
+cal.save(f)
+assert len(f.getvalue()) == 6 + 4 * 8, "Calibration files should be 8 bytes per point"
+f.seek(0)
+loaded = pantilthat.Calibration.load(f)
+assert loaded.angles == cal.angles and loaded.pulses == cal.pulses, "Calibration should load what was saved"
+
+pt.servo_calibration(1, cal)
+pt.pan(67.5)
+assert pt.get_pan_us() == 2050 and pt.get_pan(precise=True) == 67.5, "pan() should use the calibration"
+pt.servo_calibration(1, None)
+pt.servo_pulse_min(1, 510)
+pt.servo_pulse_max(1, 2300)
+
+measured = calibrate(pantilthat.pantilthat, 1, lambda us: (us - 1405) / 10.0, settle=0)
+assert measured.to_us(0) == 1405 and len(measured.angles) == 9, "calibrate() should measure across the pulse range"
+print("OK!")
+
+print("\nTesting register cache...")
+pt.pan(10)
+regs[REG_SERVO1] = regs[REG_SERVO1 + 1] = 0
+hits = pt.cache_info()['hits']
+pt.pan(10)
+assert regs[REG_SERVO1] == 0, "pan() should not rewrite an unchanged servo register"
+assert pt.get_pan() == 10, "get_pan() should be answered from the register cache"
+assert pt.cache_info()['hits'] >= hits + 2, "cache_info() should count the skipped write and read"
+pt.refresh()
+assert pt.get_pan() == 0 and pt.get_tilt() == 0, "refresh() should re-read the servo registers"
+pt.pan(10)
+assert pt.get_pan() == 10 and regs[REG_SERVO1] != 0, "pan() should write after refresh()"
+print("OK!")
+
 print("\nTesting full sweep...")
 # Perform a full sweep to catch any bounds errors
 for x in range(-90, 91):
@@ -237,6 +317,672 @@ assert_raises(lambda: pt.servo_pulse_max(3, 510), ValueError,
               "ValueError not raised by servo_pulse_min index out of range")
 print("OK! - ValueError raised by servo_pulse_min index of out range.")
 
+print("\nTesting background writes...")
+class SlowSMBus(SMBus):
+    def write_word_data(self, addr, reg, data):
+        time.sleep(0.005)
+        SMBus.write_word_data(self, addr, reg, data)
+
+bg = pantilthat.PanTilt(idle_timeout=0, i2c_bus=SlowSMBus(1), background_writes=True)
+for x in range(-100, 100):
+    bg.pan(x / 2.0)
+bg.flush()
+info = bg.writer_info()
+assert info['queued'] >= 200, "writer_info() should count every queued write"
+assert info['written'] < 20, "Queued writes to the same register should be merged, {} were written".format(info['written'])
+assert bg.get_pan() == 49 and regs[REG_SERVO1] | (regs[REG_SERVO1 + 1] << 8) == 1931, "The newest servo value should be written"
+bg.background_writes(False)
+
+class GatedSMBus(SMBus):
+    def __init__(self, bus_id):
+        SMBus.__init__(self, bus_id)
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+
+    def write_byte_data(self, addr, reg, data):
+        self.entered.set()
+        self.gate.wait()
+        SMBus.write_byte_data(self, addr, reg, data)
+
+# Stall the writer on a config write, so the pan_tilt block is still queued when pan is called
+gated = GatedSMBus(1)
+gpt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=gated, background_writes=True)
+gpt.servo_enable(1, True)
+gated.entered.wait()
+gpt.pan_tilt(10, 20)
+gpt.pan(30)
+gated.gate.set()
+gpt.flush()
+assert regs[REG_SERVO1] | (regs[REG_SERVO1 + 1] << 8) == gpt.get_pan_us(), "pan() should update the queued pan_tilt block"
+assert regs[REG_SERVO2] | (regs[REG_SERVO2 + 1] << 8) == gpt.get_tilt_us() and gpt.get_tilt() == 20, "pan() should not drop the queued tilt"
+gpt.background_writes(False)
+
+class NackSMBus(SMBus):
+    failing = False
+
+    def write_word_data(self, addr, reg, data):
+        if self.failing:
+            raise IOError("NACK")
+        SMBus.write_word_data(self, addr, reg, data)
+
+    def write_i2c_block_data(self, addr, reg, data):
+        if self.failing:
+            raise IOError("NACK")
+        SMBus.write_i2c_block_data(self, addr, reg, data)
+
+nack = NackSMBus(1)
+npt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=nack, background_writes=True,
+                         retry_policy=pantilthat.RetryPolicy(retries=1, delay=0))
+npt.pan(0)
+npt.flush()
+nack.failing = True
+npt.pan(10)
+assert_raises(lambda: npt.flush(), IOError, "IOError not raised by a failed background write")
+nack.failing = False
+npt.pan(10)
+npt.flush()
+assert regs[REG_SERVO1] | (regs[REG_SERVO1 + 1] << 8) == npt._servo_to_us(0, 10), "A failed background write should be sent again"
+
+npt.set_all(1, 2, 3)
+npt.show()
+npt.flush()
+nack.failing = True
+npt.set_all(4, 5, 6)
+npt.show()
+assert_raises(lambda: npt.flush(), IOError, "IOError not raised by a failed background show")
+nack.failing = False
+npt.show()
+npt.flush()
+assert regs[REG_WS2812:REG_WS2812 + 3] == [4, 5, 6], "LED blocks that failed in the background should be sent again"
+npt.background_writes(False)
+print("OK!")
+
+print("\nTesting retry policies...")
+class FlakySMBus(SMBus):
+    failing = True
+
+    def write_byte_data(self, addr, reg, data):
+        if self.failing:
+            raise IOError("NACK")
+        SMBus.write_byte_data(self, addr, reg, data)
+
+    def read_byte_data(self, addr, reg):
+        if self.failing:
+            raise IOError("NACK")
+        return SMBus.read_byte_data(self, addr, reg)
+
+flaky = FlakySMBus(1)
+breaker = pantilthat.CircuitBreaker(pantilthat.BackoffPolicy(deadline=0.01), threshold=2, probe_interval=0.02)
+fpt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=flaky, retry_policy=breaker)
+
+for x in range(2):
+    t_start = time.time()
+    assert_raises(lambda: fpt.servo_enable(1, True), IOError, "IOError not raised by failing bus")
+    assert time.time() - t_start < 0.05, "BackoffPolicy should give up after its deadline"
+assert breaker.is_open(), "CircuitBreaker should open after repeated failures"
+assert_raises(lambda: fpt.servo_enable(1, True), pantilthat.CircuitOpenError, "CircuitOpenError not raised by open breaker")
+
+flaky.failing = False
+time.sleep(0.1)
+assert not breaker.is_open(), "CircuitBreaker should close once the probe succeeds"
+fpt.servo_enable(1, True)
+print("OK!")
+
+print("\nTesting I2CDevTransport...")
+from pantilthat.transport import I2C_RDWR, I2C_M_RD
+transactions = []
+
+def fake_ioctl(fd, request, arg):
+    assert request == I2C_RDWR, "I2CDevTransport should only use I2C_RDWR"
+    transactions.append(arg.nmsgs)
+    for index in range(arg.nmsgs):
+        msg = arg.msgs[index]
+        if msg.flags & I2C_M_RD:
+            for offset in range(msg.len):
+                msg.buf[offset] = regs[reg + offset]
+        else:
+            reg = msg.buf[0]
+            for offset in range(1, msg.len):
+                regs[reg + offset - 1] = msg.buf[offset]
+
+dev = pantilthat.PanTilt(idle_timeout=0, i2c_bus=pantilthat.I2CDevTransport(fd=-1, ioctl=fake_ioctl))
+dev.setup()
+dev.set_all(10, 20, 30)
+del transactions[:]
+dev.show()
+assert transactions == [4], "show() should send the LED blocks and REG_UPDATE as one transaction"
+assert regs[REG_WS2812:REG_WS2812 + 6] == [10, 20, 30, 10, 20, 30] and regs[REG_UPDATE] == 1, "WS2812 regs contain incorrect value!"
+dev.servo_two(0)
+assert regs[REG_SERVO2] | (regs[REG_SERVO2 + 1] << 8) == 1450, "Servo 2 regs contain incorrect value!"
+dev.refresh()
+assert dev.get_tilt() == 0, "refresh() readback incorrect"
+print("OK!")
+
+print("\nTesting instrumentation...")
+from pantilthat.metrics import flatten
+flaky = FlakySMBus(1)
+ipt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=flaky, instrumentation=True,
+                         retry_policy=pantilthat.RetryPolicy(retries=3, delay=0))
+assert_raises(lambda: ipt.setup(), IOError, "IOError not raised by failing bus")
+flaky.failing = False
+ipt.servo_enable(1, True)
+ipt.pan(0)
+ipt.pan(0)
+bus = ipt.stats()['bus']
+assert bus['write_byte_data:0x00']['failures'] == 1 and bus['write_byte_data:0x00']['calls'] == 3, "Failed config write should be counted"
+assert bus['write_byte_data:0x00']['retries'] == 2, "Retries should be counted"
+assert bus['write_word_data:0x01']['calls'] == 1 and bus['write_word_data:0x01']['bytes'] == 2, "Servo write should be counted once"
+assert sum(bus['write_word_data:0x01']['histogram_us'].values()) == 1, "Latency histogram should count every call"
+assert flatten(ipt.stats())['pantilthat_bus_write_word_data_0x01_calls'] == 1, "flatten() should name metrics by operation and register"
+ipt.reset_stats()
+assert ipt.stats()['bus'] == {} and ipt.stats()['cache']['hits'] == 0, "reset_stats() should clear statistics"
+print("OK!")
+
+print("\nTesting SimulatedHAT...")
+from pantilthat.simulator import SimulatedHAT
+hat = SimulatedHAT(bus_speed=100000)
+spt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=hat)
+spt.pan(0)
+assert hat.servo_pulse(1) == 0, "Servo pulse should not change until the next PWM frame"
+hat.advance(0.02)
+assert hat.servo_pulse(1) == 1450, "Servo pulse should change at the next PWM frame"
+assert hat.servo_pulse(2) == 0, "Disabled servo should have no pulse"
+t_start = hat.time()
+spt.set_all(255, 0, 0)
+spt.show()
+assert abs(hat.time() - t_start - ((78 + 4) * 9 + 5) / 100000.0) < 1e-9, "show() should take 7.43ms on a 100kHz bus"
+assert hat.leds()[:3] == b"\x00\x00\x00", "LEDs should not change until the update has latched"
+hat.advance(spt.UPDATE_WAIT)
+assert hat.leds()[:3] == b"\xff\x00\x00", "LEDs should change once the update has latched"
+
+hat = SimulatedHAT(nack_rate=0.5, seed=1)
+spt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=hat, retry_policy=pantilthat.RetryPolicy(retries=20, delay=0))
+for x in range(-90, 91):
+    spt.pan(x)
+assert hat.nacks > 0 and spt.get_pan() == 90, "Retries should recover from NACKs"
+print("OK!")
+
+print("\nTesting light types...")
+hat = SimulatedHAT()
+lpt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=hat, light_type=pantilthat.GRB)
+lpt.setup()
+lpt.set_pixel(1, 1, 2, 3)
+lpt.show()
+hat.advance(lpt.UPDATE_WAIT)
+assert hat.leds()[:6] == b"\x00\x00\x00\x02\x01\x03", "GRB pixels should be sent green first"
+
+lpt.light_type(pantilthat.GRBW)
+assert lpt.num_pixels() == 18, "GRBW should support 18 pixels"
+lpt.set_all(0, 0, 0, 9)
+lpt.set_all(1, 2, 3)
+lpt.show()
+hat.advance(lpt.UPDATE_WAIT)
+assert hat.leds()[:72] == b"\x02\x01\x03\x09" * 18, "set_all() should fill every pixel, keeping white if it is not given"
+assert_raises(lambda: lpt.set_all(256, 0, 0), ValueError, "ValueError not raised by set_all out of range")
+assert_raises(lambda: lpt.set_pixel(18, 0, 0, 0), ValueError, "ValueError not raised by set_pixel index out of range")
+assert_raises(lambda: lpt.light_type(4), ValueError, "ValueError not raised by invalid light type")
+
+print("\nTesting set_pixels...")
+frame = [(x, x + 1, x + 2, 100 + x) for x in range(18)]
+expected = b"".join(bytearray([x + 1, x, x + 2, 100 + x]) for x in range(18))
+lpt.set_pixels(frame)
+lpt.show()
+hat.advance(lpt.UPDATE_WAIT)
+assert hat.leds()[:72] == expected, "set_pixels() should reorder channels for GRBW"
+lpt.clear()
+lpt._set_pixels_list(frame)
+assert lpt._pixels[:72] == expected, "set_pixels() without NumPy should reorder channels for GRBW"
+lpt.clear()
+lpt._set_pixels_list(bytes(bytearray(v for row in frame for v in row)))
+assert lpt._pixels[:72] == expected, "set_pixels() should accept a buffer"
+
+lpt.light_type(pantilthat.RGB)
+assert_raises(lambda: lpt.set_pixels([(0, 0, 0)] * 18), ValueError, "ValueError not raised by short frame")
+assert_raises(lambda: lpt._set_pixels_list([(0, 0, 0)] * 18), ValueError, "ValueError not raised by short frame")
+assert_raises(lambda: lpt._set_pixels_list([(256, 0, 0)] * 24), ValueError, "ValueError not raised by frame out of range")
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+if numpy is not None:
+    frame = numpy.zeros((24, 3), dtype=int)
+    frame[:, 0] = numpy.arange(24)
+    lpt.light_type(pantilthat.GRB)
+    lpt.set_pixels(frame)
+    assert lpt._pixels[3:6] == b"\x00\x01\x00", "set_pixels() should reorder channels for GRB"
+    frame[0, 0] = 256
+    assert_raises(lambda: lpt.set_pixels(frame), ValueError, "ValueError not raised by frame out of range")
+    assert_raises(lambda: lpt.set_pixels(frame / 2.0), TypeError, "TypeError not raised by float frame")
+print("OK!")
+
+print("\nTesting gamma and pixel brightness...")
+hat = SimulatedHAT()
+gpt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=hat)
+gpt.setup()
+gpt.set_all(255, 128, 0)
+gpt.pixel_brightness(0.5)
+gpt.show()
+hat.advance(gpt.UPDATE_WAIT)
+assert hat.leds()[:3] == b"\x80\x40\x00" and gpt._pixels[:3] == b"\xff\x80\x00", "pixel_brightness() should scale the output, not the buffer"
+assert hat.registers[REG_WS2812 + 72] == 1, "The trailing byte should not be scaled"
+
+gpt.pixel_brightness(1.0)
+gpt.gamma((2.0, 1.0, 1.0))
+gpt.show()
+hat.advance(gpt.UPDATE_WAIT)
+assert hat.leds()[:3] == b"\xff\x80\x00", "gamma() should only correct the given channels"
+gpt.set_pixel(0, 128, 128, 128)
+gpt.show()
+hat.advance(gpt.UPDATE_WAIT)
+assert hat.leds()[:3] == b"\x40\x80\x80", "gamma() should correct red"
+
+gpt.light_type(pantilthat.GRB)
+gpt.gamma(1.0)
+gpt.pixel_brightness((1.0, 0.0, 1.0))
+gpt.show()
+hat.advance(gpt.UPDATE_WAIT)
+assert hat.leds()[:3] == b"\x00\x80\x80", "Channel corrections should follow the light type"
+gpt.pixel_brightness(1.0)
+assert gpt._luts is None, "No correction should mean no lookup tables"
+assert_raises(lambda: gpt.pixel_brightness(1.5), ValueError, "ValueError not raised by pixel_brightness out of range")
+assert_raises(lambda: gpt.gamma(0), ValueError, "ValueError not raised by gamma(0)")
+print("OK!")
+
+print("\nTesting animation...")
+from pantilthat import animation
+frame = animation.Frame(8)
+animation.Chase((255, 0, 0), length=2, speed=10).render(frame, 0.35)
+assert frame[3] == (255, 0, 0) and frame[2] == (255, 0, 0) and frame[4] == (0, 0, 0), "Chase should light length pixels behind its head"
+animation.Breathe((200, 100, 0), period=2.0).render(frame, 1.0)
+assert frame[0] == (200, 100, 0) and frame[7] == (200, 100, 0), "Breathe should be at full brightness half way through a breath"
+animation.Flash((10, 20, 30), rate=1.0, duty=0.5).render(frame, 0.75)
+assert frame[0] == (0, 0, 0), "Flash should be off after its duty"
+animation.Blend(animation.Flash((200, 0, 0)), animation.Flash((0, 0, 100)), mix=0.25).render(frame, 0)
+assert frame[5] == (150, 0, 25), "Blend should mix both effects"
+animation.Rainbow(spread=1.0).render(frame, 0)
+assert frame[0] == (255, 0, 0) and frame[4] == (0, 255, 255), "Rainbow should spread hues across the pixels"
+
+hat = SimulatedHAT()
+apt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=hat, light_type=pantilthat.GRBW)
+animator = animation.Animator(apt, fps=200)
+
+def red_frames(count):
+    for x in range(count):
+        yield [(255, 0, 0, x)] * 18
+
+animator.play(red_frames(5))
+time.sleep(0.2)
+assert animator.stats.frames == 5, "A generator effect should stop the animation when it ends"
+hat.advance(apt.UPDATE_WAIT)
+assert hat.leds()[:4] == b"\x00\xff\x00\x04", "Animator should send frames in the strip's channel order"
+
+def slow(frame, t):
+    frame.fill((0, 0, 255))
+    end = time.time() + 0.016
+    while time.time() < end:
+        pass
+
+animator.play(slow)
+time.sleep(0.1)
+animator.play(animation.Flash((0, 255, 0), duty=1.0), fade=0.02)
+time.sleep(0.1)
+stats = animator.stats.as_dict()
+assert stats['missed'] > 5 and stats['effect_time_max'] >= 0.01, "Animator should count missed frames and effect CPU time"
+assert animator.frame()[0] == (0, 255, 0, 0), "The fade should end on the new effect"
+
+animator.play(red_frames(3))
+animator.play(animation.Flash((0, 0, 255), duty=1.0), fade=0.2)
+time.sleep(0.1)
+assert animator.frame()[0] == (0, 0, 255, 0), "A fade should carry on with the new effect when the old one runs out"
+
+def slow_end():
+    yield [(255, 0, 0, 0)] * 18
+    time.sleep(0.1)
+
+animator.play(slow_end())
+time.sleep(0.05)
+animator.play(animation.Flash((0, 255, 0), duty=1.0))
+time.sleep(0.15)
+assert animator.frame()[0] == (0, 255, 0, 0), "An effect played while the old one was ending should be shown"
+animator.stop()
+assert apt._pixels[:72] == bytearray(72), "stop() should clear the LEDs"
+print("OK!")
+
+print("\nTesting animation recording...")
+import os
+import tempfile
+from pantilthat import recording
+hat = SimulatedHAT()
+rpt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=hat, light_type=pantilthat.GRBW)
+rpt.setup()
+rpt.pixel_brightness(0.5)
+path = os.path.join(tempfile.mkdtemp(), 'test.pta')
+with recording.Recorder(path, rpt, fps=500) as recorder:
+    for x in range(10):
+        rpt.set_all(x * 20, 0, 0, 100)
+        rpt.show()
+    assert_raises(lambda: recording.Recorder(path + '2', rpt), ValueError, "ValueError not raised by recording twice")
+rpt.show()
+assert recorder.frames == 10 and os.path.getsize(path) == 16 + 10 * 73, "Recorder should write a frame per show()"
+
+with recording.Player(path) as player:
+    assert player.frames == 10 and player.pixels == 18 and player.light_type == pantilthat.GRBW and player.fps == 500, "Player should read the header"
+    assert bytes(player.frame(9)[:4]) == b"\x00\x5a\x00\x32", "Frames should be recorded as sent, after colour correction"
+
+    hat = SimulatedHAT()
+    ppt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=hat, light_type=pantilthat.GRBW)
+    stats = player.play(ppt)
+    assert stats.sent + stats.merged == 10, "Player should play every frame"
+    hat.advance(ppt.UPDATE_WAIT)
+    assert hat.leds()[:4] == b"\x00\x5a\x00\x32", "Player should send the final frame"
+    assert_raises(lambda: player.play(pantilthat.PanTilt(i2c_bus=SimulatedHAT())), ValueError, "ValueError not raised by playing on the wrong light type")
+
+    stop = threading.Event()
+    threading.Timer(0.05, stop.set).start()
+    t_start = time.time()
+    stats = player.play(ppt, loop=True, stop=stop)
+    assert time.time() - t_start < 1 and stats.sent > 10, "Setting stop should end looped playback"
+
+with open(path, 'r+b') as f:
+    f.write(b'XXXX')
+assert_raises(lambda: recording.Player(path), ValueError, "ValueError not raised by invalid animation file")
+print("OK!")
+
+print("\nTesting frame coalescing...")
+hat = SimulatedHAT()
+fpt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=hat, frame_interval=0.02)
+fpt.pan_tilt(0, 0)
+before = hat.transactions
+t_start = time.time()
+for x in range(60):
+    fpt.pan_tilt(x, -x)
+    assert fpt.get_pan() == x, "Reads should return the newest target"
+    time.sleep(1.0 / 300)
+elapsed = time.time() - t_start
+time.sleep(0.05)
+info = fpt.frame_info()
+assert info['commands'] == 122 and info['coalesced'] > 60, "frame_info() should count coalesced commands"
+assert hat.transactions - before <= elapsed / 0.02 + 2, "At most one write per frame should reach the bus"
+assert fpt.get_pan_us() == fpt._servo_to_us(0, 59) and hat.registers[REG_SERVO1] | (hat.registers[REG_SERVO1 + 1] << 8) == fpt._servo_to_us(0, 59), "The newest target should be written"
+
+fpt.pan(10)
+fpt.pan(20)
+fpt.flush()
+assert hat.registers[REG_SERVO1] | (hat.registers[REG_SERVO1 + 1] << 8) == fpt._servo_to_us(0, 20), "flush() should send held servo writes"
+fpt.frame_coalescing(None)
+before = hat.transactions
+fpt.pan(30)
+fpt.pan(40)
+assert hat.transactions - before == 2, "Writes should be sent immediately with coalescing disabled"
+assert_raises(lambda: fpt.frame_coalescing(0), ValueError, "ValueError not raised by frame_coalescing(0)")
+print("OK!")
+
+if sys.version_info >= (3, 2):
+    print("\nTesting Fleet...")
+    from pantilthat.transport import Transport
+
+    class SharedSimulatedBus(Transport):
+        """Several simulated HATs on one bus, which notices overlapping transfers."""
+        def __init__(self, *hats):
+            self.hats = dict((hat.address, hat) for hat in hats)
+            self.active = 0
+            self.overlaps = 0
+
+        def _call(self, method, addr, *args):
+            self.active += 1
+            if self.active > 1:
+                self.overlaps += 1
+            try:
+                return getattr(self.hats[addr], method)(addr, *args)
+            finally:
+                self.active -= 1
+
+        def write_i2c_block_data(self, addr, reg, data):
+            self._call('write_i2c_block_data', addr, reg, data)
+
+        def read_byte_data(self, addr, reg):
+            return self._call('read_byte_data', addr, reg)
+
+        def read_word_data(self, addr, reg):
+            return self._call('read_word_data', addr, reg)
+
+        def write_many(self, addr, writes):
+            self._call('write_many', addr, writes)
+
+    bus_a = SharedSimulatedBus(SimulatedHAT(address=0x15, bus_speed=10000, realtime=True),
+                               SimulatedHAT(address=0x16, bus_speed=10000, realtime=True))
+    bus_b = SharedSimulatedBus(SimulatedHAT(address=0x15, bus_speed=10000, realtime=True),
+                               SimulatedHAT(address=0x16, bus_speed=10000, realtime=True))
+
+    fleet = pantilthat.Fleet()
+    for bus, address, name in [('a', 0x15, 'a1'), ('a', 0x16, 'a2'), ('b', 0x15, 'b1'), ('b', 0x16, 'b2')]:
+        fleet.add(name, bus=bus, address=address, i2c_bus=bus_a if bus == 'a' else bus_b, idle_timeout=0)
+    assert fleet.names() == ['a1', 'a2', 'b1', 'b2'], "Fleet should keep devices in order"
+    assert_raises(lambda: fleet.add('a3', bus='a', address=0x16), ValueError, "ValueError not raised by duplicate address")
+    fleet.move_all(0, 0)
+
+    t_start = time.time()
+    for x in range(10):
+        fleet.move({'a1': (x, -x), 'a2': (-x, x), 'b1': (x, x), 'b2': (-x, -x)})
+    elapsed = time.time() - t_start
+    # 40 moves of ~5.6ms each on the bus, split across two buses
+    assert elapsed < 40 * 0.0056 * 0.8, "Buses should work in parallel, took {:.3f}s".format(elapsed)
+    assert bus_a.overlaps == 0 and bus_b.overlaps == 0, "Devices on the same bus should take turns"
+    assert fleet['a2'].get_pan() == -9 and fleet.call({'b1': ('get_tilt', ())})['b1'] == 9, "Every device should reach its position"
+
+    latency = fleet.latency()
+    assert latency['a1']['calls'] == 11 and latency['a1']['latency_max'] >= latency['a1']['latency_mean'] > 0, "Fleet should record per-device latency"
+    assert_raises(lambda: fleet.move({'b2': (100, 0)}), ValueError, "ValueError not raised by bad move")
+    assert fleet.latency()['b2']['errors'] == 1, "Fleet should count failed commands"
+    fleet.close()
+    print("OK!")
+
+print("\nTesting servo position estimates...")
+spt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=SimulatedHAT())
+spt.servo_speed(1, 0.1)
+spt.servo_speed(2, 0.2, 60)
+assert_raises(lambda: spt.servo_speed(3, 0.1), ValueError, "ValueError not raised by servo_speed(3)")
+assert_raises(lambda: spt.servo_speed(1, 0), ValueError, "ValueError not raised by servo_speed(1, 0)")
+spt.pan_tilt(0, 0)
+assert not spt.wait_until_settled(0.01), "Moving from an unknown position should take the worst case time"
+assert spt.wait_until_settled(1), "Servos should settle"
+assert tuple(round(a) for a in spt.estimated_position()) == (0, 0), "Settled servos should be where they were told to go"
+
+t_start = time.time()
+spt.pan_tilt(30, -30)
+time.sleep(0.025)
+pan, tilt = spt.estimated_position()
+assert 10 < pan < 25 and -5 > tilt > -12, "Estimate should follow the servos' speed, got {}".format((pan, tilt))
+assert spt.wait_until_settled(), "Servos should settle"
+elapsed = time.time() - t_start
+assert 0.095 < elapsed < 0.15, "Should wait for the slowest servo, waited {:.3f}s".format(elapsed)
+assert tuple(round(a) for a in spt.estimated_position()) == (30, -30), "Settled servos should be where they were told to go"
+
+spt.pan(30)
+assert spt.wait_until_settled(0), "Unchanged servos should not need to settle"
+print("OK!")
+
+print("\nTesting idle timeouts...")
+hat = SimulatedHAT()
+tpt = pantilthat.PanTilt(idle_timeout=0.1, i2c_bus=hat)
+tpt.pan(0)
+threads = threading.active_count()
+for x in range(400):
+    tpt.pan(x % 2)
+    tpt.tilt(x % 2)
+assert threading.active_count() <= threads + 1, "Idle timeouts should not start a thread per move"
+time.sleep(0.05)
+tpt.pan(10)
+time.sleep(0.07)
+assert hat.registers[REG_CONFIG] & 0b11 == 0b01, "Moving should restart only that servo's idle timeout"
+time.sleep(0.1)
+assert hat.registers[REG_CONFIG] & 0b11 == 0, "Idle timeout should disable both servos"
+tpt.pan(20)
+assert hat.registers[REG_CONFIG] & 0b11 == 0b01, "Moving should re-enable the servo"
+time.sleep(0.15)
+assert hat.registers[REG_CONFIG] & 0b11 == 0, "Idle timeout should work after firing"
+print("OK!")
+
+print("\nTesting motion profiles...")
+for shape in [pantilthat.TRAPEZOID, pantilthat.SCURVE]:
+    for distance in [5, 180]:
+        profile = pantilthat.Profile(-90, -90 + distance, 180, 720, shape)
+        samples = [profile.position(profile.duration * x / 100.0) for x in range(101)]
+        assert samples[0] == -90 and samples[-1] == -90 + distance, "Profile should start and end at rest on target"
+        assert all(b >= a for a, b in zip(samples, samples[1:])), "Profile should move monotonically"
+        assert abs(samples[50] - (-90 + distance / 2.0)) < 1e-9, "Profile should be symmetrical"
+        assert max(b - a for a, b in zip(samples, samples[1:])) / (profile.duration / 100.0) <= 180.001, "Profile should not exceed max_speed"
+
+profile = pantilthat.Profile(0, 90, 90, 180)
+assert abs(profile.duration - 1.5) < 1e-9, "Trapezoid profile should take 0.5s to accelerate, cruise for 0.5s and 0.5s to stop"
+print("OK!")
+
+print("\nTesting MotionController...")
+mpt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=SimulatedHAT())
+mpt.pan_tilt(12.3, -4.5)
+motion = pantilthat.MotionController(mpt)
+assert motion.position() == (mpt.get_pan(precise=True), mpt.get_tilt(precise=True)), "Moves should start from the fractional position"
+motion.stop()
+motion = pantilthat.MotionController(mpt, rate=200)
+move = motion.move_to(45, -45, max_speed=900, accel=9000)
+assert move.wait(1), "Move should finish"
+assert motion.position() == (45, -45) and mpt.get_pan() == 45 and mpt.get_tilt() == -45, "Move should reach its target"
+
+move = motion.move_to(-45, 45, max_speed=90, accel=90, shape=pantilthat.SCURVE)
+time.sleep(0.1)
+move.cancel()
+assert move.wait(0) and move.cancelled(), "Move should be cancelled"
+time.sleep(0.05)
+pan, tilt = motion.position()
+assert 0 < 45 - pan < 5 and pan == -tilt, "Cancelled move should stop where it was"
+motion.stop()
+print("OK!")
+
+print("\nTesting play_trajectory...")
+def sweep(count, interval):
+    for x in range(count):
+        yield (x * interval, x % 90, -(x % 90))
+
+stats = pantilthat.play_trajectory(mpt, sweep(20, 0.005), tolerance=0.05)
+assert stats.sent == 20 and stats.merged == 0 and stats.dropped == 0, "On time waypoints should all be sent"
+assert stats.jitter_max < 0.05, "Jitter should be within tolerance"
+
+# A 10kHz bus takes 6.5ms to send each waypoint, so playback at 1ms intervals has to skip
+slow = pantilthat.PanTilt(idle_timeout=0, i2c_bus=SimulatedHAT(bus_speed=10000, realtime=True))
+slow.setup()
+t_start = time.time()
+stats = pantilthat.play_trajectory(slow, sweep(200, 0.001))
+assert time.time() - t_start < 0.3, "Playback should not fall behind"
+assert stats.merged > 100 and stats.sent + stats.merged == 200, "Late waypoints should be merged"
+assert slow.get_pan() == 199 % 90, "The final waypoint should always be sent"
+
+stats = pantilthat.play_trajectory(slow, sweep(200, 0.001), late=pantilthat.DROP)
+assert stats.dropped > 100 and stats.sent + stats.dropped == 200, "Late waypoints should be dropped"
+
+stop = threading.Event()
+threading.Timer(0.05, stop.set).start()
+t_start = time.time()
+stats = pantilthat.play_trajectory(mpt, [(0, 0, 0), (5, 10, 10)], stop=stop)
+assert time.time() - t_start < 1 and stats.sent == 1, "Setting stop should end playback without waiting for the next waypoint"
+print("OK!")
+
+if numpy is not None:
+    print("\nTesting trajectories...")
+    from pantilthat import trajectory
+    t_start = time.time()
+    path = trajectory.lissajous(600, pan_frequency=0.03, tilt_frequency=0.05)
+    assert len(path) == 30000 and path.duration == 600, "Trajectory should have one sample per 1/rate seconds"
+    assert time.time() - t_start < 0.5, "Building a long trajectory should be fast"
+
+    path = trajectory.raster(3, 0.1, pan=(-90, 90), tilt=(-30, 30), rate=50)
+    assert list(path.pan[:5]) == [-90, -45, 0, 45, 90] and list(path.pan[5:10]) == [90, 45, 0, -45, -90], "Raster rows should alternate direction"
+    assert list(path.tilt[::5]) == [-30, 0, 30], "Raster should step tilt between rows"
+    assert len(path.repeat(2)) == 30 and len(path.then(path)) == 30, "Trajectories should join"
+    assert_raises(lambda: trajectory.Trajectory([0, 91], 0), ValueError, "ValueError not raised by out of range trajectory")
+
+    tpt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=SimulatedHAT())
+    pan, tilt = path.to_pulses(tpt)
+    assert list(pan[:3]) == [575, 1012, 1450] and tilt[0] == tpt._servo_to_us(1, -30), "to_pulses() should follow the servo range"
+    tpt.servo_calibration(1, pantilthat.Calibration([(-90, 600), (0, 1500), (90, 2400)]))
+    assert list(path.to_pulses(tpt)[0][:3]) == [600, 1050, 1500], "to_pulses() should use the calibration"
+
+    stats = path.play(tpt)
+    assert stats.sent + stats.merged == 15 and tpt.get_pan() == 90 and tpt.get_tilt() == 30, "Playback should end on the final sample"
+
+    stop = threading.Event()
+    threading.Timer(0.05, stop.set).start()
+    t_start = time.time()
+    stats = trajectory.Trajectory([0, 10], 0, rate=0.2).play(tpt, stop=stop)
+    assert time.time() - t_start < 1 and stats.sent == 1, "Setting stop should end playback without waiting for the next sample"
+    print("OK!")
+
+print("\nTesting TargetTracker...")
+pid = pantilthat.PID(1.0, ki=10.0, output_limit=5.0, integral_limit=100.0)
+for x in range(100):
+    assert pid.update(20.0, 0.1) == 5.0, "PID output should be limited"
+assert pid.update(-1.0, 0.1) < 5.0, "PID integral should not wind up while saturated"
+assert pantilthat.PID(1.0, deadband=0.5).update(0.4, 0.1) == 0.0, "Errors inside the deadband should be ignored"
+
+tpt = pantilthat.PanTilt(idle_timeout=0, i2c_bus=SimulatedHAT())
+tpt.pan_tilt(0, 0)
+tracker = pantilthat.TargetTracker(tpt, resolution=(640, 480), fov=(64, 48), kp=0.5, ki=0.5, max_speed=90, min_step=0.1)
+
+def target_pixel(pan, tilt):
+    # Where a fixed target at pan 30, tilt -20 appears in the image
+    return (320 + (30 - pan) * 10, 240 + (-20 - tilt) * 10)
+
+x, y = target_pixel(0, 0)
+assert tracker.update(x, y, timestamp=0) == (0.0, 0.0), "First update should not move without a frame interval"
+assert tracker.update(x, y, timestamp=1 / 30.0) == (3.0, -3.0), "Second update should be slew rate limited"
+for frame in range(2, 60):
+    x, y = target_pixel(*tracker.position())
+    tracker.update(x, y, timestamp=frame / 30.0)
+    assert abs(tpt.get_pan(precise=True) - tracker.position()[0]) < 0.6, "Tracker should have moved the servos"
+pan, tilt = tracker.position()
+assert abs(pan - 30) < 0.5 and abs(tilt + 20) < 0.5, "Tracker should centre the target"
+stats = tracker.stats()
+assert stats['updates'] == 60 and stats['settle_time'] is not None, "Tracker should record settle time"
+
+writes = stats['writes']
+for frame in range(60, 90):
+    tracker.update(320, 240, timestamp=frame / 30.0)
+assert tracker.stats()['writes'] == writes, "A centred target should not move the servos"
+
+tracker.lost()
+assert tracker.update(640, 240, timestamp=0) == (pan, tilt), "First update after lost() should not move"
+tracker.update(640, 240, timestamp=0.1)
+assert abs(tracker.position()[0] - pan) <= 9 + 1e-6, "Slew rate should be limited"
+
+for max_speed in (180, 30):
+    tpt.pan_tilt(-60, 0)
+    tracker = pantilthat.TargetTracker(tpt, resolution=(640, 480), fov=(64, 48), kp=0.5, ki=0.5, max_speed=max_speed)
+    furthest = -90
+    for frame in range(300):
+        pan, tilt = tracker.position()
+        tracker.update(320 + (25 - pan) * 10, 240 - tilt * 10, timestamp=frame / 30.0)
+        furthest = max(furthest, tracker.position()[0])
+    assert furthest < 27, "Slew limited moves should not wind up the integral and overshoot"
+    assert tracker.pids[0]._integral == 0.0, "The integral should be cleared inside the deadband"
+print("OK!")
+
+if sys.version_info >= (3, 7):
+    print("\nTesting benchmarks...")
+    from pantilthat import bench
+    results = bench.run(iterations=10)['results']
+    assert sorted(results.keys()) == sorted(bench.BENCHMARKS.keys()), "Every benchmark should run"
+    assert results['show']['i2c_transactions_per_call'] == 1.0, "show() should be a single combined transaction"
+    print("OK!")
+
+if sys.version_info >= (3, 7):
+    # async def is a syntax error on Python 2, so these tests live in their own module
+    import test_async
+
+    print("\nTesting PanTiltAsync...")
+    test_async.run(pantilthat, SMBus, regs)
+    print("OK!")
+
 print("\n=== LIGHTS ===")
 
 print("\nTesting range checks...")
@@ -265,6 +1011,23 @@ i2c_assert(lambda: pt.show(),
            "WS2812 regs contain incorrect value!")
 print("OK!")
 
+print("\nTesting show only sends changed blocks...")
+regs[REG_WS2812 + 40] = 0
+regs[REG_UPDATE] = 0
+saved = pt.bytes_saved()
+pt.show()
+assert regs[REG_UPDATE] == 0, "show() should not send anything when the buffer is unchanged"
+assert pt.bytes_saved() == saved + 74, "bytes_saved() should count the whole skipped buffer"
+
+pt.set_pixel(0, 0, 0, 0)
+pt.show()
+assert regs[REG_WS2812] == 0 and regs[REG_UPDATE] == 1, "show() should send the changed block"
+assert regs[REG_WS2812 + 40] == 0, "show() should not resend unchanged blocks"
+assert pt.bytes_saved() == saved + 74 + 41, "bytes_saved() should count the skipped blocks"
+pt.set_all(255, 255, 255)
+pt.show()
+print("OK!")
+
 print("\nChecking brightness ignored in WS2812 mode...")
 expected = 255
 pt.brightness(222)
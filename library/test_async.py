@@ -0,0 +1,59 @@
+"""asyncio tests for PanTiltAsync, run by test.py on Python 3.7 and later."""
+import asyncio
+
+
+REG_CONFIG = 0x00
+REG_SERVO1 = 0x01
+REG_SERVO2 = 0x03
+REG_WS2812 = 0x05
+REG_UPDATE = 0x4e
+
+
+async def async_test(pantilthat, SMBus, regs):
+    apt = pantilthat.PanTiltAsync(idle_timeout=0.05, i2c_bus=SMBus(1))
+    await apt.setup()
+    assert regs[REG_CONFIG] == 0b00001100, "Config reg incorrect!: {}".format(regs[REG_CONFIG])
+
+    await apt.pan_tilt(-45, 45)
+    assert await apt.get_pan() == -45 and await apt.get_tilt() == 45, "PanTiltAsync readback incorrect"
+    assert regs[REG_CONFIG] == 0b00001111, "pan_tilt() should enable both servos"
+
+    await asyncio.sleep(0.1)
+    assert regs[REG_CONFIG] == 0b00001100, "Idle timeout should disable both servos"
+
+    await apt.tilt_and_wait(0)
+    assert await apt.get_tilt() == 0, "tilt_and_wait() readback incorrect"
+
+    apt.set_all(1, 2, 3)
+    await apt.show()
+    assert regs[REG_WS2812:REG_WS2812 + 3] == [1, 2, 3] and regs[REG_UPDATE] == 1, "WS2812 regs contain incorrect value!"
+
+    await apt.close()
+    assert regs[REG_CONFIG] == 0b00001100, "close() should disable both servos"
+
+    class FailingSMBus(SMBus):
+        failing = False
+
+        def write_i2c_block_data(self, addr, reg, data):
+            if self.failing:
+                raise IOError("NACK")
+            SMBus.write_i2c_block_data(self, addr, reg, data)
+
+    bus = FailingSMBus(1)
+    fpt = pantilthat.PanTiltAsync(idle_timeout=0, i2c_bus=bus,
+                                  retry_policy=pantilthat.RetryPolicy(retries=1, delay=0))
+    await fpt.pan_tilt(0, 0)
+    bus.failing = True
+    try:
+        await fpt.pan_tilt(10, 20)
+    except IOError:
+        pass
+    else:
+        raise AssertionError("IOError not raised by a failed pan_tilt")
+    bus.failing = False
+    await fpt.pan_tilt(10, 20)
+    assert regs[REG_SERVO2] | (regs[REG_SERVO2 + 1] << 8) == fpt._pantilt._servo_to_us(1, 20), "A failed pan_tilt should be sent again in full"
+
+
+def run(pantilthat, SMBus, regs):
+    asyncio.run(async_test(pantilthat, SMBus, regs))
@@ -25,6 +25,7 @@ def set_brightness(brightness):
 
     global _brightness
     _brightness = brightness
+    pantilthat.pixel_brightness(brightness)
 
 
 def clear():
@@ -35,18 +36,23 @@ def show():
     pantilthat.show()
 
 
+def _scale(value, brightness):
+    if brightness is None:
+        return int(value)
+
+    if _brightness == 0:
+        return 0
+
+    # show() already dims every pixel by _brightness, so only scale by the difference
+    return min(255, int(value * brightness / _brightness))
+
+
 def set_all(r, g, b, brightness=None):
-    global _brightness
-    if brightness is not None:
-        _brightness = brightness
-    pantilthat.set_all(int(r*_brightness), int(g*_brightness), int(b*_brightness))
+    pantilthat.set_all(_scale(r, brightness), _scale(g, brightness), _scale(b, brightness))
 
 
 def set_pixel(x, r, g, b, brightness=None):
-    global _brightness
-    if brightness is not None:
-        _brightness = brightness
-    pantilthat.set_pixel(x, int(r*_brightness), int(g*_brightness), int(b*_brightness))
+    pantilthat.set_pixel(x, _scale(r, brightness), _scale(g, brightness), _scale(b, brightness))
 
 
 def set_clear_on_exit(value=True):
@@ -72,5 +78,6 @@ def interrupt_handler(signum, frame):
 # Module Initialisation
 pantilthat.light_mode(pantilthat.WS2812)
 pantilthat.light_type(pantilthat.GRBW)
+pantilthat.pixel_brightness(_brightness)
 atexit.register(_exit)
 signal.signal(signal.SIGINT, interrupt_handler)